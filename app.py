@@ -1,110 +1,1582 @@
  (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
 diff --git a//dev/null b/app.py
-index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115e78c29f0 100644
+index 0000000000000000000000000000000000000000..0fc52957feff3f47b43ac3ce1e34f9658055ec80 100644
 --- a//dev/null
 +++ b/app.py
-@@ -0,0 +1,618 @@
+@@ -0,0 +1,4036 @@
++import argparse
++import base64
++import csv
++import gzip
++import io
 +import json
++import math
 +import os
++import queue
++import re
++import selectors
++import signal
++import socket
 +import sqlite3
-+from datetime import datetime
++import subprocess
++import sys
++import threading
++import time
++from bisect import bisect_left
++from collections import OrderedDict, deque
++from concurrent.futures import ThreadPoolExecutor, wait
++from contextlib import contextmanager
++from datetime import datetime, timedelta, timezone
++from email.utils import formatdate, parsedate_to_datetime
 +from http import HTTPStatus
 +from http.server import BaseHTTPRequestHandler, HTTPServer
 +from pathlib import Path
-+from urllib.parse import urlparse
++from urllib.parse import parse_qs, unquote, urlparse
 +
 +BASE_DIR = Path(__file__).resolve().parent
-+DB_PATH = BASE_DIR / "inventory.db"
++DB_PATH = Path(os.environ.get("INVENTORY_DB", BASE_DIR / "inventory.db"))
++LOCATION_NAMES = [name.strip() for name in os.environ.get("LOCATIONS", "").split(",") if name.strip()]
++LOCATIONS_DIR = Path(os.environ.get("LOCATIONS_DIR", BASE_DIR / "locations"))
++DEFAULT_LOCATION = os.environ.get("DEFAULT_LOCATION", LOCATION_NAMES[0] if LOCATION_NAMES else "default")
++LOCATION_NAME_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
++LOCATION_METRICS = (
++    ("inventory_item_cache_hits_total", "counter", "Serialized item cache hits"),
++    ("inventory_item_cache_misses_total", "counter", "Serialized item cache misses"),
++    ("inventory_item_cache_bytes", "gauge", "Bytes held by the serialized item cache"),
++    ("inventory_barcode_cache_hits_total", "counter", "Barcode lookups served from memory"),
++    ("inventory_barcode_cache_misses_total", "counter", "Barcode lookups read from the database"),
++    ("inventory_barcode_cache_entries", "gauge", "Item rows held by the barcode cache"),
++    ("inventory_history_cache_hits_total", "counter", "Stock history served from memory"),
++    ("inventory_history_cache_misses_total", "counter", "Stock history rebuilt from the ledger"),
++    ("inventory_event_subscribers", "gauge", "Connected event stream clients"),
++    ("inventory_write_batches_total", "counter", "Transactions committed by the write coordinator"),
++    ("inventory_write_operations_total", "counter", "Writes executed through the coordinator"),
++    ("inventory_write_rejected_total", "counter", "Batched writes rolled back to their savepoint"),
++    ("inventory_write_failed_batches_total", "counter", "Batches whose transaction failed"),
++    ("inventory_write_queue_depth", "gauge", "Writes waiting for the coordinator"),
++)
++GROUP_WORKERS = int(os.environ.get("GROUP_WORKERS", "8"))
++GROUP_SHARD_TIMEOUT = float(os.environ.get("GROUP_SHARD_TIMEOUT", "2"))
 +STATIC_DIR = BASE_DIR / "static"
++SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "8"))
++SERVER_QUEUE_SIZE = int(os.environ.get("SERVER_QUEUE_SIZE", "64"))
++SERVER_BACKLOG = int(os.environ.get("SERVER_BACKLOG", "128"))
++KEEPALIVE_TIMEOUT = float(os.environ.get("KEEPALIVE_TIMEOUT", "5"))
++KEEPALIVE_MAX_REQUESTS = int(os.environ.get("KEEPALIVE_MAX_REQUESTS", "100"))
++KEEPALIVE_MAX_DRAIN_BYTES = int(os.environ.get("KEEPALIVE_MAX_DRAIN_BYTES", str(64 * 1024)))
++SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", "10"))
++PROCESSES = int(os.environ.get("PROCESSES", str(os.cpu_count() or 1)))
++WORKER_RESTART_DELAY = float(os.environ.get("WORKER_RESTART_DELAY", "1"))
++METRICS_COLLECT_TIMEOUT = float(os.environ.get("METRICS_COLLECT_TIMEOUT", "1"))
++DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
++DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
++DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))
++EVENT_RING_SIZE = int(os.environ.get("EVENT_RING_SIZE", "1024"))
++EVENT_MAX_CLIENTS = int(os.environ.get("EVENT_MAX_CLIENTS", "500"))
++EVENT_HEARTBEAT_SECONDS = float(os.environ.get("EVENT_HEARTBEAT_SECONDS", "15"))
++EVENT_CLIENT_BUFFER_BYTES = 256 * 1024
++EVENT_RELAY_BUFFER_BYTES = 4 * 1024 * 1024
++ITEMS_PAGE_SIZE = 100
++ACTIVITY_PAGE_SIZE = 25
++SEARCH_PAGE_SIZE = 20
++MAX_PAGE_SIZE = 500
++MAX_SEARCH_TERMS = 10
++DASHBOARD_SECTIONS = ("summary", "chart", "alerts", "items", "recent_usage", "movements")
++DASHBOARD_DEFAULT_SECTIONS = ("summary", "chart", "alerts", "recent_usage", "movements")
++HISTORY_DEFAULT_DAYS = 365
++HISTORY_DEFAULT_POINTS = 200
++HISTORY_MAX_POINTS = 2000
++HISTORY_CACHE_SIZE = int(os.environ.get("HISTORY_CACHE_SIZE", "1024"))
++ITEM_FIELDS = (
++    "id",
++    "barcode",
++    "name",
++    "brand",
++    "item_type",
++    "attributes",
++    "unit_size",
++    "unit_cost",
++    "stock_level",
++    "min_stock",
++    "max_stock",
++    "stock_value",
++    "status",
++    "created_at",
++    "updated_at",
++)
++ACTIVITY_FIELDS = ("id", "change_amount", "reason", "created_at", "name")
++NEW_ITEM_FIELDS = (
++    "barcode",
++    "name",
++    "brand",
++    "item_type",
++    "attributes",
++    "unit_size",
++    "total_cost",
++    "stock_level",
++    "min_stock",
++    "max_stock",
++)
++STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", "300"))
++STATIC_CACHE_MAX_FILE_BYTES = int(os.environ.get("STATIC_CACHE_MAX_FILE_BYTES", str(1024 * 1024)))
++STATIC_CONTENT_TYPES = {
++    ".html": "text/html; charset=utf-8",
++    ".css": "text/css; charset=utf-8",
++    ".js": "application/javascript; charset=utf-8",
++    ".json": "application/json; charset=utf-8",
++    ".svg": "image/svg+xml",
++    ".png": "image/png",
++    ".jpg": "image/jpeg",
++    ".jpeg": "image/jpeg",
++    ".gif": "image/gif",
++    ".ico": "image/x-icon",
++}
++COMPRESSIBLE_SUFFIXES = {".html", ".css", ".js", ".json", ".svg"}
++WRITE_BATCH_WINDOW_MS = float(os.environ.get("WRITE_BATCH_WINDOW_MS", "2"))
++WRITE_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_SIZE", "64"))
++BARCODE_CACHE_SIZE = int(os.environ.get("BARCODE_CACHE_SIZE", "4096"))
++ITEM_CACHE_MAX_BYTES = int(os.environ.get("ITEM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
++GZIP_MIN_BYTES = int(os.environ.get("GZIP_MIN_BYTES", "1024"))
++GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
++MAX_BULK_ROWS = int(os.environ.get("MAX_BULK_ROWS", "10000"))
++SQL_CHUNK_SIZE = 500
++EXPORT_MAX_CONCURRENT = int(os.environ.get("EXPORT_MAX_CONCURRENT", "2"))
++EXPORT_CHUNK_BYTES = 64 * 1024
++EXPORT_SEND_TIMEOUT = float(os.environ.get("EXPORT_SEND_TIMEOUT", "60"))
++LEDGER_RETENTION_DAYS = int(os.environ.get("LEDGER_RETENTION_DAYS", "365"))
++FORECAST_LEAD_DAYS = float(os.environ.get("FORECAST_LEAD_DAYS", "7"))
++FORECAST_WINDOWS = {"short_rate": 7, "long_rate": 28}
++SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
++REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
++BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
++SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
++METRIC_ROUTES = {
++    "/api/items",
++    "/api/items/bulk",
++    "/api/items/adjust",
++    "/api/items/adjust/bulk",
++    "/api/usage",
++    "/api/dashboard",
++    "/api/shopping-list",
++    "/api/activity",
++    "/api/events",
++    "/api/metrics",
++    "/api/stock-at",
++    "/api/search",
++    "/api/export/movements",
++    "/api/export/usage",
++    "/api/export/inventory",
++    "/api/group/dashboard",
++    "/api/v2/dashboard",
++    "/api/items/history",
++    "/api/items/{barcode}/history",
++}
++METRIC_METHODS = {"GET", "HEAD", "POST", "PUT", "OPTIONS"}
++SQL_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "PRAGMA"}
 +
 +
-+def get_connection():
-+    conn = sqlite3.connect(DB_PATH)
++class Histogram:
++    def __init__(self, buckets):
++        self.buckets = buckets
++        self.counts = [0] * (len(buckets) + 1)
++        self.sum = 0.0
++
++    def observe(self, value):
++        self.counts[bisect_left(self.buckets, value)] += 1
++        self.sum += value
++
++    def copy(self):
++        snapshot = Histogram(self.buckets)
++        snapshot.counts = list(self.counts)
++        snapshot.sum = self.sum
++        return snapshot
++
++    def samples(self, name, labels):
++        cumulative = 0
++        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
++            cumulative += count
++            yield f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}'
++        labels = f"{{{labels.rstrip(',')}}}" if labels else ""
++        yield f"{name}_sum{labels} {self.sum:.6f}"
++        yield f"{name}_count{labels} {cumulative}"
++
++
++class RequestStats(threading.local):
++    sql_seconds = 0.0
++    sql_statements = 0
++
++
++class Metrics:
++    def __init__(self):
++        self.lock = threading.Lock()
++        self.current = RequestStats()
++        self.requests = {}
++        self.request_seconds = {}
++        self.response_bytes = {}
++        self.sql_seconds = {}
++        self.db_wait_seconds = {}
++        self.in_flight = 0
++        self.rejected = 0
++        self.slow_requests = 0
++
++    def begin_request(self):
++        self.current.sql_seconds = 0.0
++        self.current.sql_statements = 0
++        with self.lock:
++            self.in_flight += 1
++
++    def end_request(self, method, path, status, seconds, sent_bytes):
++        method = method if method in METRIC_METHODS else "OTHER"
++        route = path.partition("?")[0]
++        if route.startswith("/api/items/") and route.endswith("/history") and route != "/api/items/history":
++            route = "/api/items/{barcode}/history"
++        if route not in METRIC_ROUTES:
++            route = "/api/other" if route.startswith("/api/") else "static"
++        slow = SLOW_REQUEST_MS > 0 and seconds * 1000 >= SLOW_REQUEST_MS
++        with self.lock:
++            self.in_flight -= 1
++            if status is None:
++                return
++            key = (method, route, status)
++            self.requests[key] = self.requests.get(key, 0) + 1
++            histogram = self.request_seconds.get((method, route))
++            if histogram is None:
++                histogram = self.request_seconds[(method, route)] = Histogram(REQUEST_BUCKETS)
++            histogram.observe(seconds)
++            self.response_bytes[(method, route)] = self.response_bytes.get((method, route), 0) + sent_bytes
++            if slow:
++                self.slow_requests += 1
++        if slow:
++            print(
++                f"slow request: {method} {path} status={status} duration_ms={seconds * 1000:.1f} "
++                f"sql_ms={self.current.sql_seconds * 1000:.1f} sql_statements={self.current.sql_statements} "
++                f"bytes={sent_bytes}",
++                file=sys.stderr,
++                flush=True,
++            )
++
++    def observe_sql(self, statement, seconds):
++        kind = statement.lstrip()[:7].upper().partition(" ")[0].rstrip()
++        if kind not in SQL_KINDS:
++            kind = "OTHER"
++        self.current.sql_seconds += seconds
++        self.current.sql_statements += 1
++        with self.lock:
++            histogram = self.sql_seconds.get(kind)
++            if histogram is None:
++                histogram = self.sql_seconds[kind] = Histogram(SQL_BUCKETS)
++            histogram.observe(seconds)
++
++    def observe_fetch(self, seconds):
++        self.current.sql_seconds += seconds
++
++    def observe_wait(self, mode, seconds):
++        with self.lock:
++            histogram = self.db_wait_seconds.get(mode)
++            if histogram is None:
++                histogram = self.db_wait_seconds[mode] = Histogram(SQL_BUCKETS)
++            histogram.observe(seconds)
++
++    def record_rejected(self):
++        with self.lock:
++            self.rejected += 1
++
++    def render(self, gauges=(), histograms=()):
++        with self.lock:
++            requests = dict(self.requests)
++            request_seconds = {key: value.copy() for key, value in self.request_seconds.items()}
++            response_bytes = dict(self.response_bytes)
++            sql_seconds = {key: value.copy() for key, value in self.sql_seconds.items()}
++            db_wait_seconds = {key: value.copy() for key, value in self.db_wait_seconds.items()}
++            counters = [
++                ("inventory_http_requests_in_flight", "gauge", "Requests currently being handled", self.in_flight),
++                (
++                    "inventory_http_rejected_total",
++                    "counter",
++                    "Connections refused with 503 because the queue was full",
++                    self.rejected,
++                ),
++                (
++                    "inventory_http_slow_requests_total",
++                    "counter",
++                    "Requests slower than SLOW_REQUEST_MS",
++                    self.slow_requests,
++                ),
++            ]
++        lines = [
++            "# HELP inventory_http_requests_total HTTP requests by method, route and status",
++            "# TYPE inventory_http_requests_total counter",
++        ]
++        for (method, route, status), count in sorted(requests.items()):
++            lines.append(f'inventory_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
++        lines += [
++            "# HELP inventory_http_request_duration_seconds Time spent handling HTTP requests",
++            "# TYPE inventory_http_request_duration_seconds histogram",
++        ]
++        for (method, route), histogram in sorted(request_seconds.items()):
++            lines.extend(histogram.samples("inventory_http_request_duration_seconds", f'method="{method}",route="{route}",'))
++        lines += [
++            "# HELP inventory_http_response_bytes_total Response body bytes sent",
++            "# TYPE inventory_http_response_bytes_total counter",
++        ]
++        for (method, route), total in sorted(response_bytes.items()):
++            lines.append(f'inventory_http_response_bytes_total{{method="{method}",route="{route}"}} {total}')
++        lines += [
++            "# HELP inventory_sql_duration_seconds Time spent executing SQL statements",
++            "# TYPE inventory_sql_duration_seconds histogram",
++        ]
++        for kind, histogram in sorted(sql_seconds.items()):
++            lines.extend(histogram.samples("inventory_sql_duration_seconds", f'statement="{kind}",'))
++        lines += [
++            "# HELP inventory_db_wait_seconds Time spent waiting for a database connection",
++            "# TYPE inventory_db_wait_seconds histogram",
++        ]
++        for mode, histogram in sorted(db_wait_seconds.items()):
++            lines.extend(histogram.samples("inventory_db_wait_seconds", f'mode="{mode}",'))
++        for name, kind, description, value in counters + list(gauges):
++            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
++            if isinstance(value, list):
++                lines.extend(f"{name}{{{labels}}} {sample}" for labels, sample in value)
++            else:
++                lines.append(f"{name} {value}")
++        for name, description, histogram in histograms:
++            lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
++            for labels, entry in histogram if isinstance(histogram, list) else [("", histogram)]:
++                lines.extend(entry.copy().samples(name, f"{labels}," if labels else ""))
++        return ("\n".join(lines) + "\n").encode("utf-8")
++
++
++METRICS = Metrics()
++
++
++def merge_metrics(bodies):
++    """Sum the samples of several workers' expositions; every series here is additive."""
++    lines = []
++    values = {}
++    for body in bodies:
++        for line in body.splitlines():
++            if line.startswith("#"):
++                if line not in values:
++                    values[line] = None
++                    lines.append(line)
++                continue
++            series, _, value = line.rpartition(" ")
++            if series not in values:
++                values[series] = 0
++                lines.append(series)
++            values[series] += float(value) if "." in value or "e" in value else int(value)
++    merged = [
++        line if values[line] is None else f"{line} {values[line]:.6f}" if isinstance(values[line], float) else f"{line} {values[line]}"
++        for line in lines
++    ]
++    merged += [
++        "# HELP inventory_metrics_workers Worker processes whose samples are included",
++        "# TYPE inventory_metrics_workers gauge",
++        f"inventory_metrics_workers {len(bodies)}",
++    ]
++    return "\n".join(merged) + "\n"
++
++
++class TimedCursor(sqlite3.Cursor):
++    # A statement's cost includes stepping through its rows, so the observation
++    # is held open until the rows are consumed, the cursor is reused or closed.
++    statement = None
++    elapsed = 0.0
++
++    def finish(self):
++        if self.statement is not None:
++            METRICS.observe_sql(self.statement, self.elapsed)
++            self.statement = None
++
++    def timed(self, method, *args):
++        started = time.perf_counter()
++        try:
++            return method(*args)
++        finally:
++            seconds = time.perf_counter() - started
++            if self.statement is None:
++                METRICS.observe_fetch(seconds)
++            else:
++                self.elapsed += seconds
++
++    def execute(self, sql, parameters=()):
++        self.finish()
++        self.statement, self.elapsed = sql, 0.0
++        try:
++            self.timed(super().execute, sql, parameters)
++        except BaseException:
++            self.finish()
++            raise
++        if self.description is None:
++            self.finish()
++        return self
++
++    def executemany(self, sql, seq_of_parameters):
++        self.finish()
++        self.statement, self.elapsed = sql, 0.0
++        try:
++            return self.timed(super().executemany, sql, seq_of_parameters)
++        finally:
++            self.finish()
++
++    def fetchone(self):
++        try:
++            return self.timed(super().fetchone)
++        finally:
++            self.finish()
++
++    def fetchmany(self, size=None):
++        size = self.arraysize if size is None else size
++        rows = self.timed(super().fetchmany, size)
++        if len(rows) < size:
++            self.finish()
++        return rows
++
++    def fetchall(self):
++        try:
++            return self.timed(super().fetchall)
++        finally:
++            self.finish()
++
++    def __next__(self):
++        started = time.perf_counter()
++        try:
++            row = super().__next__()
++        except BaseException:
++            self.elapsed += time.perf_counter() - started
++            self.finish()
++            raise
++        self.elapsed += time.perf_counter() - started
++        return row
++
++    def close(self):
++        self.finish()
++        super().close()
++
++
++class TimedConnection(sqlite3.Connection):
++    def cursor(self, factory=TimedCursor):
++        return super().cursor(factory)
++
++    def execute(self, sql, parameters=()):
++        return self.cursor().execute(sql, parameters)
++
++    def executemany(self, sql, seq_of_parameters):
++        return self.cursor().executemany(sql, seq_of_parameters)
++
++    def commit(self):
++        started = time.perf_counter()
++        try:
++            super().commit()
++        finally:
++            METRICS.observe_sql("COMMIT", time.perf_counter() - started)
++
++
++def sqlite_has_math():
++    conn = sqlite3.connect(":memory:")
++    try:
++        conn.execute("SELECT exp(0)")
++        return True
++    except sqlite3.OperationalError:
++        return False
++    finally:
++        conn.close()
++
++
++SQLITE_HAS_MATH = sqlite_has_math()
++
++
++def get_connection(path=DB_PATH, read_only=False):
++    if read_only:
++        conn = sqlite3.connect(
++            f"{Path(path).as_uri()}?mode=ro",
++            uri=True,
++            isolation_level=None,
++            check_same_thread=False,
++            factory=TimedConnection,
++        )
++    else:
++        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, factory=TimedConnection)
 +    conn.row_factory = sqlite3.Row
++    if not SQLITE_HAS_MATH:
++        conn.create_function("exp", 1, math.exp, deterministic=True)
++    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
++    conn.execute("PRAGMA synchronous = NORMAL")
++    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
++    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
 +    return conn
 +
 +
-+def initialize_database():
-+    conn = get_connection()
-+    try:
-+        cursor = conn.cursor()
-+        cursor.execute(
-+            """
-+            CREATE TABLE IF NOT EXISTS inventory_items (
-+                id INTEGER PRIMARY KEY AUTOINCREMENT,
-+                barcode TEXT UNIQUE NOT NULL,
-+                name TEXT NOT NULL,
-+                brand TEXT NOT NULL,
-+                item_type TEXT NOT NULL,
-+                attributes TEXT NOT NULL,
-+                unit_size TEXT NOT NULL,
-+                unit_cost REAL NOT NULL,
-+                stock_level INTEGER NOT NULL,
-+                min_stock INTEGER NOT NULL,
-+                max_stock INTEGER NOT NULL,
-+                created_at TEXT NOT NULL,
-+                updated_at TEXT NOT NULL
-+            )
-+            """
++class BarcodeCache:
++    def __init__(self, max_entries=BARCODE_CACHE_SIZE):
++        self.max_entries = max_entries
++        self.entries = OrderedDict()
++        self.staged = {}
++        self.data_version = None
++        self.hits = 0
++        self.misses = 0
++
++    def lookup(self, cursor, barcodes):
++        cursor.execute("PRAGMA data_version")
++        version = cursor.fetchone()[0]
++        if version != self.data_version:
++            self.entries.clear()
++            self.data_version = version
++        found = {}
++        missing = []
++        for barcode in dict.fromkeys(barcodes):
++            row = self.entries.get(barcode)
++            if row is None:
++                missing.append(barcode)
++            else:
++                self.entries.move_to_end(barcode)
++                found[barcode] = row
++        self.hits += len(found)
++        self.misses += len(missing)
++        if missing:
++            fetched = fetch_items_by_barcode(cursor, missing)
++            self.remember(fetched)
++            found.update(fetched)
++        return found
++
++    def remember(self, rows):
++        self.entries.update(rows)
++        while len(self.entries) > self.max_entries:
++            self.entries.popitem(last=False)
++
++    def invalidate(self, barcodes):
++        for barcode in barcodes:
++            self.entries.pop(barcode, None)
++
++    def stage(self, row):
++        self.staged[row["barcode"]] = row
++
++    def publish(self):
++        self.remember(self.staged)
++        self.staged = {}
++
++    def discard(self):
++        self.invalidate(self.staged)
++        self.staged = {}
++
++    def restore(self, staged):
++        self.invalidate(set(self.staged) - set(staged))
++        self.staged = staged
++
++    def clear(self):
++        self.entries.clear()
++        self.staged = {}
++        self.data_version = None
++
++
++class HistoryCache:
++    def __init__(self, max_entries=HISTORY_CACHE_SIZE):
++        self.max_entries = max_entries
++        self.entries = OrderedDict()
++        self.lock = threading.Lock()
++        self.hits = 0
++        self.misses = 0
++
++    def get(self, key, version):
++        with self.lock:
++            entry = self.entries.get(key)
++            if entry is None or entry[0] != version:
++                self.misses += 1
++                return None
++            self.entries.move_to_end(key)
++            self.hits += 1
++            return entry[1]
++
++    def put(self, key, version, value):
++        with self.lock:
++            self.entries[key] = (version, value)
++            self.entries.move_to_end(key)
++            while len(self.entries) > self.max_entries:
++                self.entries.popitem(last=False)
++
++
++class ConnectionPool:
++    def __init__(self, path):
++        self.path = path
++        self.barcodes = BarcodeCache()
++        self.local = threading.local()
++        self.readers = []
++        self.readers_lock = threading.Lock()
++        self.write_lock = threading.Lock()
++        self.writer_conn = None
++
++    @contextmanager
++    def reader(self):
++        conn = getattr(self.local, "conn", None)
++        if conn is None:
++            conn = get_connection(self.path, read_only=True)
++            self.local.conn = conn
++            with self.readers_lock:
++                self.readers.append(conn)
++        yield conn
++
++    @contextmanager
++    def writer(self):
++        started = time.perf_counter()
++        with self.write_lock:
++            if self.writer_conn is None:
++                self.writer_conn = get_connection(self.path)
++            conn = self.writer_conn
++            conn.execute("BEGIN IMMEDIATE")
++            METRICS.observe_wait("write", time.perf_counter() - started)
++            changes_before = conn.total_changes
++            try:
++                yield conn
++                if conn.in_transaction and conn.total_changes != changes_before:
++                    conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
++            except BaseException:
++                self.barcodes.discard()
++                if conn.in_transaction:
++                    conn.rollback()
++                raise
++            if not conn.in_transaction:
++                self.barcodes.discard()
++                return
++            try:
++                conn.commit()
++            except BaseException:
++                self.barcodes.discard()
++                raise
++            self.barcodes.publish()
++
++    def close(self):
++        with self.readers_lock:
++            readers, self.readers = self.readers, []
++        for conn in readers:
++            conn.close()
++        self.local = threading.local()
++        with self.write_lock:
++            if self.writer_conn is not None:
++                self.writer_conn.close()
++                self.writer_conn = None
++            self.barcodes.clear()
++
++
++EXPORT_SLOTS = threading.BoundedSemaphore(max(EXPORT_MAX_CONCURRENT, 1))
++
++
++class WriteRejected(Exception):
++    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
++        super().__init__(message)
++        self.status = status
++
++
++class PendingWrite:
++    def __init__(self, operation):
++        self.operation = operation
++        self.result = None
++        self.error = None
++        self.done = threading.Event()
++
++
++class WriteCoordinator:
++    def __init__(self, pool, window_ms=WRITE_BATCH_WINDOW_MS, max_batch=WRITE_BATCH_SIZE):
++        self.pool = pool
++        self.window = window_ms / 1000
++        self.max_batch = max(max_batch, 1)
++        self.pending = queue.Queue()
++        self.lock = threading.Lock()
++        self.thread = None
++        self.batches = 0
++        self.operations = 0
++        self.rejected = 0
++        self.failed_batches = 0
++        self.batch_sizes = Histogram(BATCH_BUCKETS)
++
++    def submit(self, operation):
++        write = PendingWrite(operation)
++        self.start()
++        self.pending.put(write)
++        write.done.wait()
++        if write.error is not None:
++            raise write.error
++        return write.result
++
++    def start(self):
++        with self.lock:
++            if self.thread is None:
++                self.thread = threading.Thread(target=self.run, name="write-coordinator", daemon=True)
++                self.thread.start()
++
++    def run(self):
++        while True:
++            write = self.pending.get()
++            if write is None:
++                return
++            batch = [write]
++            deadline = time.monotonic() + self.window
++            closing = False
++            while len(batch) < self.max_batch:
++                remaining = deadline - time.monotonic()
++                try:
++                    write = self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait()
++                except queue.Empty:
++                    break
++                if write is None:
++                    closing = True
++                    break
++                batch.append(write)
++            self.execute(batch)
++            if closing:
++                return
++
++    def execute(self, batch):
++        try:
++            with self.pool.writer() as conn:
++                for write in batch:
++                    staged = dict(self.pool.barcodes.staged)
++                    conn.execute("SAVEPOINT batched_write")
++                    try:
++                        write.result = write.operation(conn)
++                    except Exception as exc:
++                        conn.execute("ROLLBACK TO batched_write")
++                        self.pool.barcodes.restore(staged)
++                        # Data the operation could not store is the caller's error, not the batch's.
++                        if isinstance(exc, sqlite3.IntegrityError):
++                            exc = WriteRejected(str(exc), HTTPStatus.CONFLICT)
++                        elif isinstance(exc, ValueError):
++                            exc = WriteRejected(str(exc))
++                        write.error = exc
++                    conn.execute("RELEASE batched_write")
++        except Exception as exc:
++            self.failed_batches += 1
++            for write in batch:
++                if write.error is None:
++                    write.error = exc
++                    write.result = None
++        self.batches += 1
++        self.operations += len(batch)
++        self.rejected += sum(1 for write in batch if write.error is not None)
++        self.batch_sizes.observe(len(batch))
++        for write in batch:
++            write.done.set()
++
++    def close(self):
++        with self.lock:
++            thread, self.thread = self.thread, None
++        if thread is not None:
++            self.pending.put(None)
++            thread.join(SHUTDOWN_TIMEOUT)
++
++
++class Location:
++    def __init__(self, name, path):
++        self.name = name
++        self.path = path
++        self.pool = ConnectionPool(path)
++        self.writes = WriteCoordinator(self.pool)
++        self.item_cache = SerializedItemCache()
++        self.history = HistoryCache()
++        self.events = EventHub()
++
++    def metric_values(self):
++        return {
++            "inventory_item_cache_hits_total": self.item_cache.hits,
++            "inventory_item_cache_misses_total": self.item_cache.misses,
++            "inventory_item_cache_bytes": self.item_cache.size,
++            "inventory_barcode_cache_hits_total": self.pool.barcodes.hits,
++            "inventory_barcode_cache_misses_total": self.pool.barcodes.misses,
++            "inventory_barcode_cache_entries": len(self.pool.barcodes.entries),
++            "inventory_history_cache_hits_total": self.history.hits,
++            "inventory_history_cache_misses_total": self.history.misses,
++            "inventory_event_subscribers": len(self.events.clients),
++            "inventory_write_batches_total": self.writes.batches,
++            "inventory_write_operations_total": self.writes.operations,
++            "inventory_write_rejected_total": self.writes.rejected,
++            "inventory_write_failed_batches_total": self.writes.failed_batches,
++            "inventory_write_queue_depth": self.writes.pending.qsize(),
++        }
++
++    def close(self):
++        self.writes.close()
++        self.events.close()
++        self.pool.close()
++
++
++def configure_locations(names=LOCATION_NAMES):
++    if not names:
++        return {"default": Location("default", DB_PATH)}
++    locations = {}
++    for name in names:
++        if not LOCATION_NAME_PATTERN.fullmatch(name):
++            raise ValueError(f"Invalid location name {name!r}")
++        locations[name] = Location(name, LOCATIONS_DIR / f"{name}.db")
++    return locations
++
++
++def create_base_schema(cursor):
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS inventory_items (
++            id INTEGER PRIMARY KEY AUTOINCREMENT,
++            barcode TEXT UNIQUE NOT NULL,
++            name TEXT NOT NULL,
++            brand TEXT NOT NULL,
++            item_type TEXT NOT NULL,
++            attributes TEXT NOT NULL,
++            unit_size TEXT NOT NULL,
++            unit_cost REAL NOT NULL,
++            stock_level INTEGER NOT NULL,
++            min_stock INTEGER NOT NULL,
++            max_stock INTEGER NOT NULL,
++            created_at TEXT NOT NULL,
++            updated_at TEXT NOT NULL
 +        )
-+        cursor.execute(
-+            """
-+            CREATE TABLE IF NOT EXISTS usage_records (
-+                id INTEGER PRIMARY KEY AUTOINCREMENT,
-+                client_name TEXT NOT NULL,
-+                usage_date TEXT NOT NULL,
-+                before_state TEXT NOT NULL,
-+                after_state TEXT NOT NULL,
-+                total_cost REAL NOT NULL,
-+                created_at TEXT NOT NULL
-+            )
-+            """
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS usage_records (
++            id INTEGER PRIMARY KEY AUTOINCREMENT,
++            client_name TEXT NOT NULL,
++            usage_date TEXT NOT NULL,
++            before_state TEXT NOT NULL,
++            after_state TEXT NOT NULL,
++            total_cost REAL NOT NULL,
++            created_at TEXT NOT NULL
 +        )
-+        cursor.execute(
-+            """
-+            CREATE TABLE IF NOT EXISTS usage_items (
-+                id INTEGER PRIMARY KEY AUTOINCREMENT,
-+                usage_id INTEGER NOT NULL,
-+                item_id INTEGER NOT NULL,
-+                amount_used INTEGER NOT NULL,
-+                cost REAL NOT NULL,
-+                FOREIGN KEY (usage_id) REFERENCES usage_records(id) ON DELETE CASCADE,
-+                FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
-+            )
-+            """
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS usage_items (
++            id INTEGER PRIMARY KEY AUTOINCREMENT,
++            usage_id INTEGER NOT NULL,
++            item_id INTEGER NOT NULL,
++            amount_used INTEGER NOT NULL,
++            cost REAL NOT NULL,
++            FOREIGN KEY (usage_id) REFERENCES usage_records(id) ON DELETE CASCADE,
++            FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
 +        )
-+        cursor.execute(
-+            """
-+            CREATE TABLE IF NOT EXISTS shopping_list (
-+                id INTEGER PRIMARY KEY AUTOINCREMENT,
-+                item_id INTEGER NOT NULL UNIQUE,
-+                added_at TEXT NOT NULL,
-+                FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
-+            )
-+            """
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS shopping_list (
++            id INTEGER PRIMARY KEY AUTOINCREMENT,
++            item_id INTEGER NOT NULL UNIQUE,
++            added_at TEXT NOT NULL,
++            FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
++        )
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS inventory_movements (
++            id INTEGER PRIMARY KEY AUTOINCREMENT,
++            item_id INTEGER NOT NULL,
++            change_amount INTEGER NOT NULL,
++            reason TEXT NOT NULL,
++            created_at TEXT NOT NULL,
++            FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
++        )
++        """
++    )
++
++
++def add_query_indexes(cursor):
++    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_items_name ON inventory_items (name, id)")
++    cursor.execute(
++        """
++        CREATE INDEX IF NOT EXISTS idx_movements_created
++        ON inventory_movements (created_at, item_id, change_amount, reason)
++        """
++    )
++    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_records_created ON usage_records (created_at)")
++    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_items_usage ON usage_items (usage_id, item_id, amount_used)")
++    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shopping_list_added ON shopping_list (added_at, item_id)")
++
++
++def stock_status_sql(row):
++    return (
++        f"CASE WHEN {row}.stock_level <= {row}.min_stock THEN 'low' "
++        f"WHEN {row}.stock_level >= {row}.max_stock THEN 'overstock' ELSE 'ok' END"
++    )
++
++
++def summary_delta_sql(row, sign):
++    status = stock_status_sql(row)
++    return f"""
++        UPDATE inventory_summary SET
++            total_value = total_value {sign} {row}.unit_cost * {row}.stock_level,
++            total_units = total_units {sign} {row}.stock_level,
++            item_count = item_count {sign} 1,
++            low_count = low_count {sign} ({status} = 'low'),
++            overstock_count = overstock_count {sign} ({status} = 'overstock')
++        WHERE id = 1;
++    """
++
++
++def add_inventory_summary(cursor):
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS inventory_summary (
++            id INTEGER PRIMARY KEY CHECK (id = 1),
++            total_value REAL NOT NULL,
++            total_units INTEGER NOT NULL,
++            item_count INTEGER NOT NULL,
++            low_count INTEGER NOT NULL,
++            overstock_count INTEGER NOT NULL
++        )
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS stock_alerts (
++            item_id INTEGER PRIMARY KEY,
++            status TEXT NOT NULL,
++            FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
++        )
++        """
++    )
++    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_alerts_status ON stock_alerts (status, item_id)")
++    insert_alert = f"""
++        INSERT INTO stock_alerts (item_id, status)
++        SELECT NEW.id, status FROM (SELECT {stock_status_sql("NEW")} AS status) WHERE status != 'ok';
++    """
++    cursor.execute(
++        f"""
++        CREATE TRIGGER IF NOT EXISTS inventory_summary_insert AFTER INSERT ON inventory_items
++        BEGIN
++            {summary_delta_sql("NEW", "+")}
++            {insert_alert}
++        END
++        """
++    )
++    cursor.execute(
++        f"""
++        CREATE TRIGGER IF NOT EXISTS inventory_summary_update
++        AFTER UPDATE OF stock_level, unit_cost, min_stock, max_stock ON inventory_items
++        BEGIN
++            {summary_delta_sql("OLD", "-")}
++            {summary_delta_sql("NEW", "+")}
++            DELETE FROM stock_alerts WHERE item_id = OLD.id;
++            {insert_alert}
++        END
++        """
++    )
++    cursor.execute(
++        f"""
++        CREATE TRIGGER IF NOT EXISTS inventory_summary_delete AFTER DELETE ON inventory_items
++        BEGIN
++            {summary_delta_sql("OLD", "-")}
++            DELETE FROM stock_alerts WHERE item_id = OLD.id;
++        END
++        """
++    )
++    rebuild_inventory_summary(cursor)
++
++
++def compute_inventory_summary(cursor):
++    cursor.execute(
++        f"""
++        SELECT COALESCE(SUM(unit_cost * stock_level), 0) AS total_value,
++               COALESCE(SUM(stock_level), 0) AS total_units,
++               COUNT(*) AS item_count,
++               COALESCE(SUM({stock_status_sql("inventory_items")} = 'low'), 0) AS low_count,
++               COALESCE(SUM({stock_status_sql("inventory_items")} = 'overstock'), 0) AS overstock_count
++        FROM inventory_items
++        """
++    )
++    return dict(cursor.fetchone())
++
++
++def summary_drift(cursor):
++    actual = compute_inventory_summary(cursor)
++    cursor.execute("SELECT * FROM inventory_summary WHERE id = 1")
++    row = cursor.fetchone()
++    stored = dict(row) if row is not None else {}
++    drift = {}
++    for key, value in actual.items():
++        current = stored.get(key)
++        if current is None or abs(current - value) > 0.005:
++            drift[key] = {"stored": current, "actual": value}
++    cursor.execute(
++        f"""
++        WITH expected AS (
++            SELECT id AS item_id, {stock_status_sql("inventory_items")} AS status FROM inventory_items
++        )
++        SELECT
++            (SELECT COUNT(*) FROM (
++                SELECT item_id, status FROM expected WHERE status != 'ok'
++                EXCEPT SELECT item_id, status FROM stock_alerts
++            ))
++            + (SELECT COUNT(*) FROM (
++                SELECT item_id, status FROM stock_alerts
++                EXCEPT SELECT item_id, status FROM expected
++            ))
++        """
++    )
++    mismatched = cursor.fetchone()[0]
++    if mismatched:
++        drift["stock_alerts"] = {"mismatched_items": mismatched}
++    return drift
++
++
++def rebuild_inventory_summary(cursor):
++    summary = compute_inventory_summary(cursor)
++    cursor.execute(
++        """
++        INSERT OR REPLACE INTO inventory_summary (id, total_value, total_units, item_count, low_count, overstock_count)
++        VALUES (1, :total_value, :total_units, :item_count, :low_count, :overstock_count)
++        """,
++        summary,
++    )
++    cursor.execute("DELETE FROM stock_alerts")
++    cursor.execute(
++        f"""
++        INSERT INTO stock_alerts (item_id, status)
++        SELECT id, status FROM (SELECT id, {stock_status_sql("inventory_items")} AS status FROM inventory_items)
++        WHERE status != 'ok'
++        """
++    )
++    return summary
++
++
++def add_data_version(cursor):
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS data_version (
++            id INTEGER PRIMARY KEY CHECK (id = 1),
++            version INTEGER NOT NULL
++        )
++        """
++    )
++    cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 1)")
++
++
++def current_data_version(conn):
++    return conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
++
++
++def add_ledger_snapshots(cursor):
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS stock_snapshots (
++            item_id INTEGER NOT NULL,
++            taken_at TEXT NOT NULL,
++            stock_level INTEGER NOT NULL,
++            PRIMARY KEY (item_id, taken_at),
++            FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
++        ) WITHOUT ROWID
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS inventory_movements_archive (
++            id INTEGER PRIMARY KEY,
++            item_id INTEGER NOT NULL,
++            change_amount INTEGER NOT NULL,
++            reason TEXT NOT NULL,
++            created_at TEXT NOT NULL
++        )
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS ledger_compactions (
++            id INTEGER PRIMARY KEY AUTOINCREMENT,
++            cutoff TEXT NOT NULL,
++            pruned INTEGER NOT NULL,
++            movements INTEGER NOT NULL DEFAULT 0,
++            snapshots INTEGER NOT NULL DEFAULT 0,
++            started_at TEXT NOT NULL,
++            completed_at TEXT
++        )
++        """
++    )
++    cursor.execute(
++        "CREATE INDEX IF NOT EXISTS idx_movements_item_created ON inventory_movements (item_id, created_at, change_amount)"
++    )
++    cursor.execute(
++        """
++        CREATE INDEX IF NOT EXISTS idx_movements_archive_created
++        ON inventory_movements_archive (created_at, item_id, change_amount)
++        """
++    )
++    cursor.execute(
++        """
++        CREATE INDEX IF NOT EXISTS idx_movements_archive_item
++        ON inventory_movements_archive (item_id, created_at, change_amount)
++        """
++    )
++
++
++def usage_products_sql(usage_id):
++    return f"""
++        (SELECT COALESCE(GROUP_CONCAT(ii.name, ' '), '')
++         FROM usage_items ui
++         JOIN inventory_items ii ON ii.id = ui.item_id
++         WHERE ui.usage_id = {usage_id})
++    """
++
++
++def add_search_indexes(cursor):
++    cursor.execute(
++        """
++        CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
++            name, brand, item_type, attributes,
++            content='inventory_items', content_rowid='id',
++            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
++        )
++        """
++    )
++    cursor.execute(
++        """
++        CREATE VIRTUAL TABLE IF NOT EXISTS usage_fts USING fts5(
++            client_name, before_state, after_state, products,
++            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
++        )
++        """
++    )
++    cursor.execute("INSERT INTO items_fts (items_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 2.0, 1.0)')")
++    cursor.execute("INSERT INTO usage_fts (usage_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 2.0, 4.0)')")
++    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_items_item ON usage_items (item_id, usage_id)")
++    insert_item = """
++        INSERT INTO items_fts (rowid, name, brand, item_type, attributes)
++        VALUES (NEW.id, NEW.name, NEW.brand, NEW.item_type, NEW.attributes);
++    """
++    delete_item = """
++        INSERT INTO items_fts (items_fts, rowid, name, brand, item_type, attributes)
++        VALUES ('delete', OLD.id, OLD.name, OLD.brand, OLD.item_type, OLD.attributes);
++    """
++    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON inventory_items BEGIN {insert_item} END")
++    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON inventory_items BEGIN {delete_item} END")
++    cursor.execute(
++        f"""
++        CREATE TRIGGER IF NOT EXISTS items_fts_update
++        AFTER UPDATE OF name, brand, item_type, attributes ON inventory_items
++        BEGIN
++            {delete_item}
++            {insert_item}
++        END
++        """
++    )
++    cursor.execute(
++        f"""
++        CREATE TRIGGER IF NOT EXISTS usage_fts_rename AFTER UPDATE OF name ON inventory_items
++        WHEN OLD.name != NEW.name
++        BEGIN
++            UPDATE usage_fts SET products = {usage_products_sql("usage_fts.rowid")}
++            WHERE rowid IN (SELECT usage_id FROM usage_items WHERE item_id = NEW.id);
++        END
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TRIGGER IF NOT EXISTS usage_fts_insert AFTER INSERT ON usage_records
++        BEGIN
++            INSERT INTO usage_fts (rowid, client_name, before_state, after_state, products)
++            VALUES (NEW.id, NEW.client_name, NEW.before_state, NEW.after_state, '');
++        END
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TRIGGER IF NOT EXISTS usage_fts_update
++        AFTER UPDATE OF client_name, before_state, after_state ON usage_records
++        BEGIN
++            UPDATE usage_fts
++            SET client_name = NEW.client_name, before_state = NEW.before_state, after_state = NEW.after_state
++            WHERE rowid = NEW.id;
++        END
++        """
++    )
++    cursor.execute(
++        """
++        CREATE TRIGGER IF NOT EXISTS usage_fts_delete AFTER DELETE ON usage_records
++        BEGIN
++            DELETE FROM usage_fts WHERE rowid = OLD.id;
++        END
++        """
++    )
++    cursor.execute(
++        f"""
++        CREATE TRIGGER IF NOT EXISTS usage_fts_items AFTER INSERT ON usage_items
++        BEGIN
++            UPDATE usage_fts SET products = {usage_products_sql("NEW.usage_id")} WHERE rowid = NEW.usage_id;
++        END
++        """
++    )
++    cursor.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
++    cursor.execute(
++        f"""
++        INSERT INTO usage_fts (rowid, client_name, before_state, after_state, products)
++        SELECT ur.id, ur.client_name, ur.before_state, ur.after_state, {usage_products_sql("ur.id")}
++        FROM usage_records ur
++        """
++    )
++
++
++def decayed_rate_sql(column, window, at, updated_at="updated_at"):
++    return f"{column} * exp(-MAX({at} - {updated_at}, 0) / {window}.0)"
++
++
++def add_consumption_rates(cursor):
++    cursor.execute(
++        """
++        CREATE TABLE IF NOT EXISTS consumption_rates (
++            item_id INTEGER PRIMARY KEY,
++            short_rate REAL NOT NULL,
++            long_rate REAL NOT NULL,
++            updated_at REAL NOT NULL,
++            FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
 +        )
-+        cursor.execute(
-+            """
-+            CREATE TABLE IF NOT EXISTS inventory_movements (
-+                id INTEGER PRIMARY KEY AUTOINCREMENT,
-+                item_id INTEGER NOT NULL,
-+                change_amount INTEGER NOT NULL,
-+                reason TEXT NOT NULL,
-+                created_at TEXT NOT NULL,
-+                FOREIGN KEY (item_id) REFERENCES inventory_items(id) ON DELETE CASCADE
++        """
++    )
++    used = "-NEW.change_amount"
++    cursor.execute(
++        f"""
++        CREATE TRIGGER IF NOT EXISTS consumption_rates_movement AFTER INSERT ON inventory_movements
++        WHEN NEW.change_amount < 0
++        BEGIN
++            INSERT INTO consumption_rates (item_id, short_rate, long_rate, updated_at)
++            VALUES (
++                NEW.item_id,
++                {", ".join(f"{used} / {window}.0" for window in FORECAST_WINDOWS.values())},
++                julianday(NEW.created_at)
 +            )
-+            """
++            ON CONFLICT (item_id) DO UPDATE SET
++                {", ".join(
++                    f"{column} = {decayed_rate_sql(column, window, 'excluded.updated_at')}"
++                    f" + excluded.{column} * exp(-MAX(updated_at - excluded.updated_at, 0) / {window}.0)"
++                    for column, window in FORECAST_WINDOWS.items()
++                )},
++                updated_at = MAX(updated_at, excluded.updated_at);
++        END
++        """
++    )
++    cursor.execute(
++        f"""
++        INSERT OR REPLACE INTO consumption_rates (item_id, short_rate, long_rate, updated_at)
++        SELECT item_id,
++               {", ".join(
++                   f"SUM(-change_amount * exp((moment - latest) / {window}.0)) / {window}.0"
++                   for window in FORECAST_WINDOWS.values()
++               )},
++               MAX(latest)
++        FROM (
++            SELECT item_id, change_amount, julianday(created_at) AS moment,
++                   MAX(julianday(created_at)) OVER (PARTITION BY item_id) AS latest
++            FROM inventory_movements
++            WHERE change_amount < 0
 +        )
++        GROUP BY item_id
++        """
++    )
++
++
++MIGRATIONS = [
++    create_base_schema,
++    add_query_indexes,
++    add_inventory_summary,
++    add_data_version,
++    add_ledger_snapshots,
++    add_search_indexes,
++    add_consumption_rates,
++]
++
++
++def migrate(conn):
++    applied = []
++    while True:
++        conn.execute("BEGIN IMMEDIATE")
++        try:
++            version = conn.execute("PRAGMA user_version").fetchone()[0]
++            if version >= len(MIGRATIONS):
++                conn.rollback()
++                return applied
++            migration = MIGRATIONS[version]
++            migration(conn.cursor())
++            conn.execute(f"PRAGMA user_version = {version + 1}")
++        except BaseException:
++            conn.rollback()
++            raise
 +        conn.commit()
-+    finally:
-+        conn.close()
++        applied.append(migration.__name__)
++
++
++def initialize_database(locations=None):
++    locations = list(LOCATIONS.values()) if locations is None else locations
++    for location in locations:
++        Path(location.path).parent.mkdir(parents=True, exist_ok=True)
++        conn = get_connection(location.path)
++        try:
++            conn.execute("PRAGMA journal_mode = WAL")
++            for name in migrate(conn):
++                print(f"Applied migration {name}" if len(LOCATIONS) == 1 else f"{location.name}: applied migration {name}")
++        finally:
++            conn.close()
++
++
++ITEMS_PAGE_QUERY = """
++    SELECT ii.* FROM inventory_items ii
++    WHERE {filters}
++    ORDER BY ii.name, ii.id
++    LIMIT ?
++"""
++
++MOVEMENTS_PAGE_QUERY = """
++    SELECT im.id, im.change_amount, im.reason, im.created_at, ii.name
++    FROM inventory_movements im
++    CROSS JOIN inventory_items ii ON im.item_id = ii.id
++    WHERE {filters}
++    ORDER BY im.created_at DESC, im.id DESC
++    LIMIT ?
++"""
++
++RECENT_USAGE_QUERY = """
++    SELECT ur.id, ur.client_name, ur.usage_date, ur.total_cost, ur.created_at,
++           GROUP_CONCAT(ii.name || ' x' || ui.amount_used, '; ') AS details
++    FROM (SELECT * FROM usage_records ORDER BY created_at DESC LIMIT ?) ur
++    JOIN usage_items ui ON ui.usage_id = ur.id
++    JOIN inventory_items ii ON ui.item_id = ii.id
++    GROUP BY ur.id
++    ORDER BY ur.created_at DESC
++"""
++
++RECENT_MOVEMENTS_QUERY = """
++    SELECT im.id, im.change_amount, im.reason, im.created_at, ii.name
++    FROM inventory_movements im
++    CROSS JOIN inventory_items ii ON im.item_id = ii.id
++    ORDER BY im.created_at DESC
++    LIMIT ?
++"""
++
++STOCK_AT_QUERY = """
++    WITH snapshots AS (
++        SELECT item_id, stock_level, MAX(taken_at) AS taken_at
++        FROM stock_snapshots
++        WHERE taken_at <= :at {item_filter}
++        GROUP BY item_id
++    ),
++    changes AS (
++        SELECT item_id, change_amount, created_at FROM inventory_movements
++        WHERE created_at >= :floor AND created_at <= :at {item_filter}
++        UNION ALL
++        SELECT item_id, change_amount, created_at FROM inventory_movements_archive
++        WHERE created_at >= :floor AND created_at <= :at {item_filter}
++    ),
++    totals AS (
++        SELECT c.item_id, SUM(c.change_amount) AS total
++        FROM changes c
++        LEFT JOIN snapshots s ON s.item_id = c.item_id
++        WHERE c.created_at >= COALESCE(s.taken_at, '')
++        GROUP BY c.item_id
++    )
++    SELECT ii.id, ii.barcode, ii.name, COALESCE(s.stock_level, 0) + COALESCE(t.total, 0) AS stock_level
++    FROM inventory_items ii
++    LEFT JOIN snapshots s ON s.item_id = ii.id
++    LEFT JOIN totals t ON t.item_id = ii.id
++    WHERE ii.created_at <= :at {items_filter}
++    ORDER BY ii.name, ii.id
++"""
++
++HISTORY_CHANGES = """
++    SELECT id, created_at, change_amount FROM inventory_movements_archive
++    WHERE created_at > :start {item_filter}
++    UNION ALL
++    SELECT id, created_at, change_amount FROM inventory_movements
++    WHERE created_at > :start {item_filter}
++"""
++
++ITEM_HISTORY_QUERY = f"""
++    WITH changes AS ({HISTORY_CHANGES.format(item_filter="AND item_id = :item_id")})
++    SELECT created_at, (julianday(created_at) - 2440587.5) * 86400.0 AS moment,
++           SUM(change_amount) OVER (ORDER BY created_at, id) AS running
++    FROM changes
++    ORDER BY created_at, id
++"""
++
++ITEMS_HISTORY_QUERY = """
++    WITH edges AS (SELECT CAST(key AS INTEGER) AS bucket, value AS edge FROM json_each(:edges)),
++    bounds AS (SELECT bucket, LAG(edge, 1, :start) OVER (ORDER BY bucket) AS low, edge AS high FROM edges)
++    SELECT bucket,
++           (SELECT COALESCE(SUM(change_amount), 0) FROM inventory_movements WHERE created_at > low AND created_at <= high)
++           + (SELECT COALESCE(SUM(change_amount), 0) FROM inventory_movements_archive WHERE created_at > low AND created_at <= high)
++           AS delta
++    FROM bounds
++    ORDER BY bucket
++"""
++
++SEARCH_ITEMS_QUERY = """
++    SELECT ii.* FROM items_fts
++    JOIN inventory_items ii ON ii.id = items_fts.rowid
++    WHERE items_fts MATCH :match
++    ORDER BY items_fts.rank, items_fts.rowid
++    LIMIT :limit OFFSET :offset
++"""
++
++SEARCH_USAGE_QUERY = """
++    SELECT ur.id, ur.client_name, ur.usage_date, ur.before_state, ur.after_state, ur.total_cost, ur.created_at,
++           usage_fts.products
++    FROM usage_fts
++    JOIN usage_records ur ON ur.id = usage_fts.rowid
++    WHERE usage_fts MATCH :match
++    ORDER BY usage_fts.rank, usage_fts.rowid DESC
++    LIMIT :limit OFFSET :offset
++"""
++
++SHOPPING_LIST_QUERY = """
++    SELECT sl.id, sl.added_at, ii.name, ii.barcode, ii.brand, ii.item_type
++    FROM shopping_list sl
++    JOIN inventory_items ii ON sl.item_id = ii.id
++    ORDER BY sl.added_at DESC
++"""
++
++FORECAST_RATE_SQL = ", ".join(
++    decayed_rate_sql(f"cr.{column}", window, "julianday(:now)", "cr.updated_at") for column, window in FORECAST_WINDOWS.items()
++)
++
++PREDICTED_SHOPPING_QUERY = f"""
++    WITH forecast AS (
++        SELECT ii.id, ii.barcode, ii.name, ii.brand, ii.item_type, ii.stock_level, ii.min_stock, ii.max_stock,
++               sl.added_at, COALESCE(MAX({FORECAST_RATE_SQL}), 0) AS daily_usage
++        FROM inventory_items ii
++        LEFT JOIN consumption_rates cr ON cr.item_id = ii.id
++        LEFT JOIN shopping_list sl ON sl.item_id = ii.id
++    )
++    SELECT *, CASE WHEN daily_usage > 0 THEN MAX(stock_level, 0) / daily_usage END AS days_left
++    FROM forecast
++    WHERE stock_level <= min_stock + daily_usage * :lead_days
++    ORDER BY days_left IS NULL, days_left, name
++"""
++
++EXPORT_MOVEMENTS_QUERY = """
++    SELECT im.id, ii.barcode, ii.name, im.change_amount, im.reason, im.created_at
++    FROM {table} im
++    CROSS JOIN inventory_items ii ON ii.id = im.item_id
++    WHERE im.created_at >= :start AND im.created_at < :end
++    ORDER BY im.created_at
++"""
++
++EXPORT_USAGE_QUERY = """
++    SELECT ur.id AS usage_id, ur.created_at, ur.usage_date, ur.client_name, ur.before_state, ur.after_state,
++           ur.total_cost, ii.barcode, ii.name, ui.amount_used, ui.cost
++    FROM usage_records ur
++    CROSS JOIN usage_items ui ON ui.usage_id = ur.id
++    CROSS JOIN inventory_items ii ON ii.id = ui.item_id
++    WHERE ur.created_at >= :start AND ur.created_at < :end
++    ORDER BY ur.created_at
++"""
++
++EXPORT_INVENTORY_QUERY = """
++    SELECT ii.* FROM inventory_items ii
++    WHERE ii.created_at >= :start AND ii.created_at < :end
++    ORDER BY ii.name, ii.id
++"""
++
++EXPORTS = {
++    "movements": (
++        ("id", "barcode", "name", "change_amount", "reason", "created_at"),
++        [
++            EXPORT_MOVEMENTS_QUERY.format(table="inventory_movements_archive"),
++            EXPORT_MOVEMENTS_QUERY.format(table="inventory_movements"),
++        ],
++    ),
++    "usage": (
++        (
++            "usage_id",
++            "created_at",
++            "usage_date",
++            "client_name",
++            "before_state",
++            "after_state",
++            "total_cost",
++            "barcode",
++            "name",
++            "amount_used",
++            "cost",
++        ),
++        [EXPORT_USAGE_QUERY],
++    ),
++    "inventory": (ITEM_FIELDS, [EXPORT_INVENTORY_QUERY]),
++}
++
++HOT_QUERIES = [
++    ("list_items", ITEMS_PAGE_QUERY.format(filters="(ii.name, ii.id) > (?, ?)"), ("", 0, 100), {"idx_inventory_items_name"}),
++    (
++        "activity_page",
++        MOVEMENTS_PAGE_QUERY.format(filters="(im.created_at, im.id) < (?, ?)"),
++        ("9999", 0, 25),
++        {"idx_movements_created"},
++    ),
++    ("recent_usage", RECENT_USAGE_QUERY, (10,), {"idx_usage_records_created", "idx_usage_items_usage"}),
++    ("recent_movements", RECENT_MOVEMENTS_QUERY, (10,), {"idx_movements_created"}),
++    ("shopping_list", SHOPPING_LIST_QUERY, (), {"idx_shopping_list_added"}),
++    (
++        "export_movements",
++        EXPORT_MOVEMENTS_QUERY.format(table="inventory_movements"),
++        ("", "9999"),
++        {"idx_movements_created"},
++    ),
++    ("export_usage", EXPORT_USAGE_QUERY, ("", "9999"), {"idx_usage_records_created", "idx_usage_items_usage"}),
++    ("item_history", ITEM_HISTORY_QUERY, {"start": "", "item_id": 0}, {"idx_movements_item_created"}),
++    ("items_history", ITEMS_HISTORY_QUERY, {"start": "", "edges": "[]"}, {"idx_movements_created"}),
++]
++
++
++def check_query_plans(conn):
++    problems = []
++    for name, sql, params, indexes in HOT_QUERIES:
++        plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
++        missing = sorted(index for index in indexes if not any(index in detail for detail in plan))
++        if missing:
++            problems.append(f"{name} does not use {', '.join(missing)}: {' | '.join(plan)}")
++        derived = {detail.split()[1] for detail in plan if detail.startswith(("MATERIALIZE ", "CO-ROUTINE "))}
++        scans = [
++            detail
++            for detail in plan
++            if detail.startswith("SCAN ")
++            and not any(index in detail for index in indexes)
++            and "VIRTUAL TABLE" not in detail
++            and detail.split()[1] not in derived
++            and not detail.split()[1].startswith("(")
++        ]
++        if scans:
++            problems.append(f"{name} scans a full table: {' | '.join(scans)}")
++    return problems
++
++
++def accepts_gzip(headers):
++    accepted = {}
++    for part in headers.get("Accept-Encoding", "").split(","):
++        coding, _, params = part.strip().partition(";")
++        quality = 1.0
++        params = params.strip()
++        if params.startswith("q="):
++            try:
++                quality = float(params[2:])
++            except ValueError:
++                quality = 0.0
++        if coding:
++            accepted[coding.strip().lower()] = quality
++    return accepted.get("gzip", accepted.get("*", 0.0)) > 0
 +
 +
 +def json_response(handler: BaseHTTPRequestHandler, payload, status=HTTPStatus.OK):
-+    response_data = json.dumps(payload).encode("utf-8")
++    json_bytes_response(handler, json.dumps(payload).encode("utf-8"), status)
++
++
++def json_bytes_response(handler: BaseHTTPRequestHandler, response_data: bytes, status=HTTPStatus.OK):
++    compress = len(response_data) >= GZIP_MIN_BYTES and accepts_gzip(handler.headers)
++    if compress:
++        response_data = gzip.compress(response_data, compresslevel=GZIP_LEVEL)
 +    handler.send_response(status.value)
 +    handler.send_header("Content-Type", "application/json")
 +    handler.send_header("Content-Length", str(len(response_data)))
++    handler.send_header("Vary", "Accept-Encoding, X-Location")
++    if compress:
++        handler.send_header("Content-Encoding", "gzip")
++    etag = getattr(handler, "etag", None)
++    if etag and status == HTTPStatus.OK:
++        handler.send_header("ETag", etag)
++        handler.send_header("Cache-Control", "no-cache")
 +    handler.end_headers()
 +    handler.wfile.write(response_data)
 +
@@ -113,26 +1585,51 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +    json_response(handler, {"error": message}, status)
 +
 +
-+def parse_request_body(handler: BaseHTTPRequestHandler):
++def etag_matches(header_value, etag):
++    if not header_value:
++        return False
++    if header_value.strip() == "*":
++        return True
++    candidates = {candidate.strip().removeprefix("W/") for candidate in header_value.split(",")}
++    return etag.removeprefix("W/") in candidates
++
++
++def content_length(handler: BaseHTTPRequestHandler):
 +    length = int(handler.headers.get("Content-Length", "0"))
-+    if length == 0:
++    if length < 0:
++        raise ValueError("Content-Length must not be negative")
++    return length
++
++
++def read_request_body(handler: BaseHTTPRequestHandler):
++    length = content_length(handler)
++    body = handler.rfile.read(length) if length else b""
++    handler.body_read = len(body)
++    return body
++
++
++def parse_request_body(handler: BaseHTTPRequestHandler):
++    body = read_request_body(handler)
++    if not body:
 +        return {}
-+    body = handler.rfile.read(length)
 +    try:
 +        return json.loads(body.decode("utf-8"))
 +    except json.JSONDecodeError as exc:
 +        raise ValueError(f"Invalid JSON payload: {exc}")
 +
 +
++def stock_status(stock_level, min_stock, max_stock):
++    if stock_level <= min_stock:
++        return "low"
++    if stock_level >= max_stock:
++        return "overstock"
++    return "ok"
++
++
 +def serialize_item(row):
 +    attributes = json.loads(row["attributes"]) if row["attributes"] else {}
 +    stock_value = row["unit_cost"] * row["stock_level"]
-+    now_stock = row["stock_level"]
-+    status = "ok"
-+    if now_stock <= row["min_stock"]:
-+        status = "low"
-+    elif now_stock >= row["max_stock"]:
-+        status = "overstock"
++    status = stock_status(row["stock_level"], row["min_stock"], row["max_stock"])
 +    return {
 +        "id": row["id"],
 +        "barcode": row["barcode"],
@@ -152,6 +1649,567 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +    }
 +
 +
++def parse_bulk_rows(handler: BaseHTTPRequestHandler):
++    body = read_request_body(handler)
++    content_type = handler.headers.get("Content-Type", "").split(";")[0].strip().lower()
++    if content_type == "text/csv":
++        try:
++            rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
++        except (UnicodeDecodeError, csv.Error) as exc:
++            raise ValueError(f"Invalid CSV payload: {exc}")
++        for row in rows:
++            attributes = row.get("attributes")
++            if isinstance(attributes, str):
++                try:
++                    row["attributes"] = json.loads(attributes) if attributes.strip() else {}
++                except json.JSONDecodeError:
++                    pass
++    else:
++        try:
++            rows = json.loads(body.decode("utf-8")) if body else []
++        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
++            raise ValueError(f"Invalid JSON payload: {exc}")
++        if isinstance(rows, dict):
++            rows = rows.get("items")
++        if not isinstance(rows, list):
++            raise ValueError("Expected a JSON array of rows")
++    if not rows:
++        raise ValueError("No rows provided")
++    if len(rows) > MAX_BULK_ROWS:
++        raise ValueError(f"At most {MAX_BULK_ROWS} rows can be submitted at once")
++    return rows
++
++
++def normalize_barcode(value):
++    # Barcodes are stored as text; JSON clients may still send the digits as a number.
++    if isinstance(value, int) and not isinstance(value, bool):
++        value = str(value)
++    if not isinstance(value, str) or not value.strip():
++        raise ValueError("Barcode must be a non-empty string")
++    return value
++
++
++def require_text(payload, fields):
++    for field in fields:
++        value = payload[field]
++        if not isinstance(value, str) or not value.strip():
++            raise ValueError(f"{field.replace('_', ' ').capitalize()} must be a non-empty string")
++
++
++def validate_new_item(payload):
++    if not isinstance(payload, dict):
++        raise ValueError("Each row must be an object")
++    missing = [field for field in NEW_ITEM_FIELDS if field not in payload]
++    if missing:
++        raise ValueError(f"Missing fields: {', '.join(missing)}")
++    barcode = normalize_barcode(payload["barcode"])
++    require_text(payload, ("name", "brand", "item_type", "unit_size"))
++    try:
++        stock_level = int(payload["stock_level"])
++        min_stock = int(payload["min_stock"])
++        max_stock = int(payload["max_stock"])
++        total_cost = float(payload["total_cost"])
++    except (TypeError, ValueError):
++        raise ValueError("Invalid numeric values provided")
++    if stock_level <= 0:
++        raise ValueError("Stock level must be greater than zero")
++    if min_stock < 0 or max_stock <= 0 or max_stock < min_stock:
++        raise ValueError("Invalid stock thresholds")
++    if not isinstance(payload["attributes"], dict):
++        raise ValueError("Attributes must be an object")
++    return {
++        "barcode": barcode,
++        "name": payload["name"],
++        "brand": payload["brand"],
++        "item_type": payload["item_type"],
++        "attributes": json.dumps(payload["attributes"]),
++        "unit_size": payload["unit_size"],
++        "unit_cost": round(total_cost / stock_level, 4),
++        "stock_level": stock_level,
++        "min_stock": min_stock,
++        "max_stock": max_stock,
++    }
++
++
++def validate_adjustment(payload):
++    if not isinstance(payload, dict):
++        raise ValueError("Each row must be an object")
++    for field in ("barcode", "delta", "reason"):
++        if field not in payload:
++            raise ValueError(f"Missing field: {field}")
++    barcode = normalize_barcode(payload["barcode"])
++    require_text(payload, ("reason",))
++    try:
++        delta = int(payload["delta"])
++    except (TypeError, ValueError):
++        raise ValueError("Delta must be an integer")
++    if delta == 0:
++        raise ValueError("Delta cannot be zero")
++    return {"barcode": barcode, "delta": delta, "reason": payload["reason"]}
++
++
++def insert_items(conn, items):
++    now = datetime.utcnow().isoformat()
++    cursor = conn.cursor()
++    cursor.executemany(
++        """
++        INSERT INTO inventory_items (
++            barcode, name, brand, item_type, attributes, unit_size,
++            unit_cost, stock_level, min_stock, max_stock, created_at, updated_at
++        ) VALUES (
++            :barcode, :name, :brand, :item_type, :attributes, :unit_size,
++            :unit_cost, :stock_level, :min_stock, :max_stock, :created_at, :created_at
++        )
++        """,
++        [{**item, "created_at": now} for item in items],
++    )
++    cursor.executemany(
++        """
++        INSERT INTO inventory_movements (item_id, change_amount, reason, created_at)
++        SELECT id, stock_level, 'Initial stock', created_at FROM inventory_items WHERE barcode = ?
++        """,
++        [(item["barcode"],) for item in items],
++    )
++
++
++def fetch_items_by_barcode(cursor, barcodes):
++    found = {}
++    unique = list(dict.fromkeys(barcodes))
++    for start in range(0, len(unique), SQL_CHUNK_SIZE):
++        chunk = unique[start : start + SQL_CHUNK_SIZE]
++        placeholders = ", ".join("?" for _ in chunk)
++        cursor.execute(f"SELECT * FROM inventory_items WHERE barcode IN ({placeholders})", chunk)
++        found.update((row["barcode"], row) for row in cursor.fetchall())
++    return found
++
++
++def fetch_shopping_list_ids(cursor, item_ids):
++    found = set()
++    unique = list(dict.fromkeys(item_ids))
++    for start in range(0, len(unique), SQL_CHUNK_SIZE):
++        chunk = unique[start : start + SQL_CHUNK_SIZE]
++        placeholders = ", ".join("?" for _ in chunk)
++        cursor.execute(f"SELECT item_id FROM shopping_list WHERE item_id IN ({placeholders})", chunk)
++        found.update(row["item_id"] for row in cursor.fetchall())
++    return found
++
++
++def sync_shopping_list(cursor, changes, now):
++    listed = fetch_shopping_list_ids(cursor, [row["id"] for row, _ in changes])
++    added = {row["id"] for row, new_stock in changes if new_stock == 0 and row["id"] not in listed}
++    removed = {row["id"] for row, new_stock in changes if new_stock != 0 and row["id"] in listed}
++    cursor.executemany("INSERT INTO shopping_list (item_id, added_at) VALUES (?, ?)", [(item_id, now) for item_id in added])
++    cursor.executemany("DELETE FROM shopping_list WHERE item_id = ?", [(item_id,) for item_id in removed])
++    return added, removed
++
++
++def verify_ledger(cursor):
++    cursor.execute(
++        """
++        SELECT ii.barcode, ii.stock_level, COALESCE(ss.stock_level, 0) + COALESCE(im.total, 0) AS ledger_stock
++        FROM inventory_items ii
++        LEFT JOIN (
++            SELECT item_id, stock_level, MAX(taken_at) FROM stock_snapshots GROUP BY item_id
++        ) ss ON ss.item_id = ii.id
++        LEFT JOIN (
++            SELECT item_id, SUM(change_amount) AS total FROM inventory_movements GROUP BY item_id
++        ) im ON im.item_id = ii.id
++        WHERE ii.stock_level < 0 OR ii.stock_level != ledger_stock
++        """
++    )
++    return [dict(row) for row in cursor.fetchall()]
++
++
++def compact_ledger(pool, cutoff, prune=False):
++    with pool.writer() as conn:
++        compaction_id = conn.execute(
++            "INSERT INTO ledger_compactions (cutoff, pruned, started_at) VALUES (?, ?, ?)",
++            (cutoff, int(prune), datetime.utcnow().isoformat()),
++        ).lastrowid
++    movements = snapshots = 0
++    last_id = 0
++    while True:
++        with pool.writer() as conn:
++            cursor = conn.cursor()
++            cursor.execute("SELECT id FROM inventory_items WHERE id > ? ORDER BY id LIMIT ?", (last_id, SQL_CHUNK_SIZE))
++            ids = [row["id"] for row in cursor.fetchall()]
++            if not ids:
++                break
++            bounds = (ids[0], ids[-1], cutoff)
++            cursor.execute(
++                """
++                INSERT INTO stock_snapshots (item_id, taken_at, stock_level)
++                SELECT im.item_id, :cutoff, SUM(im.change_amount) + COALESCE((
++                    SELECT ss.stock_level FROM stock_snapshots ss
++                    WHERE ss.item_id = im.item_id
++                    ORDER BY ss.taken_at DESC
++                    LIMIT 1
++                ), 0)
++                FROM inventory_movements im
++                WHERE im.item_id BETWEEN :first AND :last AND im.created_at < :cutoff
++                GROUP BY im.item_id
++                """,
++                {"first": ids[0], "last": ids[-1], "cutoff": cutoff},
++            )
++            snapshots += cursor.rowcount
++            if prune:
++                cursor.execute(
++                    "DELETE FROM inventory_movements_archive WHERE item_id BETWEEN ? AND ? AND created_at < ?",
++                    bounds,
++                )
++            else:
++                cursor.execute(
++                    """
++                    INSERT INTO inventory_movements_archive (id, item_id, change_amount, reason, created_at)
++                    SELECT id, item_id, change_amount, reason, created_at FROM inventory_movements
++                    WHERE item_id BETWEEN ? AND ? AND created_at < ?
++                    """,
++                    bounds,
++                )
++            cursor.execute("DELETE FROM inventory_movements WHERE item_id BETWEEN ? AND ? AND created_at < ?", bounds)
++            movements += cursor.rowcount
++        last_id = ids[-1]
++    with pool.writer() as conn:
++        conn.execute(
++            "UPDATE ledger_compactions SET movements = ?, snapshots = ?, completed_at = ? WHERE id = ?",
++            (movements, snapshots, datetime.utcnow().isoformat(), compaction_id),
++        )
++    return movements, snapshots
++
++
++def parse_timestamp(value, name="at"):
++    try:
++        moment = datetime.fromisoformat(value)
++    except (TypeError, ValueError):
++        raise ValueError(f"{name} must be an ISO 8601 timestamp")
++    if moment.tzinfo is not None:
++        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
++    return moment.isoformat()
++
++
++def pruned_before(cursor):
++    cursor.execute("SELECT MAX(cutoff) FROM ledger_compactions WHERE pruned = 1")
++    return cursor.fetchone()[0]
++
++
++def ensure_history(cursor, at):
++    cutoff = pruned_before(cursor)
++    if cutoff is not None and cutoff > at:
++        raise LookupError(f"Movement history before {cutoff} has been pruned")
++
++
++def stock_at(cursor, at, item_id=None):
++    ensure_history(cursor, at)
++    cursor.execute(
++        "SELECT COALESCE(MAX(cutoff), '') FROM ledger_compactions WHERE completed_at IS NOT NULL AND cutoff <= ?",
++        (at,),
++    )
++    floor = cursor.fetchone()[0]
++    item_filter = "" if item_id is None else "AND item_id = :item_id"
++    cursor.execute(
++        STOCK_AT_QUERY.format(
++            item_filter=item_filter,
++            items_filter="" if item_id is None else "AND ii.id = :item_id",
++        ),
++        {"at": at, "floor": floor, "item_id": item_id},
++    )
++    return [dict(row) for row in cursor.fetchall()]
++
++
++def downsample(points, threshold):
++    if threshold < 3 or len(points) <= threshold:
++        return points
++    sampled = [points[0]]
++    every = (len(points) - 2) / (threshold - 2)
++    anchor = points[0]
++    for index in range(threshold - 2):
++        start = int(index * every) + 1
++        end = int((index + 1) * every) + 1
++        following = points[end : min(int((index + 2) * every) + 1, len(points))]
++        mean_x = sum(point[0] for point in following) / len(following)
++        mean_y = sum(point[1] for point in following) / len(following)
++        anchor = max(
++            points[start:end],
++            key=lambda point: abs((anchor[0] - mean_x) * (point[1] - anchor[1]) - (anchor[0] - point[0]) * (mean_y - anchor[1])),
++        )
++        sampled.append(anchor)
++    sampled.append(points[-1])
++    return sampled
++
++
++def item_history(cursor, item, start, end, points):
++    ensure_history(cursor, start)
++    cursor.execute(ITEM_HISTORY_QUERY, {"start": start, "item_id": item["id"]})
++    rows = cursor.fetchall()
++    base = item["stock_level"] - (rows[-1]["running"] if rows else 0)
++    series = [(datetime.fromisoformat(start).replace(tzinfo=timezone.utc).timestamp(), base, start)]
++    series += [(row["moment"], base + row["running"], row["created_at"]) for row in rows if end is None or row["created_at"] <= end]
++    return [{"at": at, "stock_level": level} for moment, level, at in downsample(series, points)]
++
++
++def items_history(cursor, start, end, points):
++    ensure_history(cursor, start)
++    first = datetime.fromisoformat(start)
++    span = datetime.fromisoformat(end) - first
++    edges = [(first + span * (bucket + 1) / points).isoformat() for bucket in range(points)]
++    cursor.execute("SELECT total_units FROM inventory_summary WHERE id = 1")
++    current = cursor.fetchone()["total_units"]
++    cursor.execute(ITEMS_HISTORY_QUERY, {"start": start, "edges": json.dumps(edges + ["9999"])})
++    deltas = [row["delta"] for row in cursor.fetchall()]
++    level = current - sum(deltas)
++    series = [{"at": start, "stock_level": level}]
++    for edge, delta in zip(edges, deltas):
++        level += delta
++        series.append({"at": edge, "stock_level": level})
++    return series
++
++
++def bulk_error_response(handler, results):
++    failed = sum(1 for result in results if result["status"] == "error")
++    json_response(
++        handler,
++        {"error": f"{failed} of {len(results)} rows are invalid; nothing was applied", "results": results},
++        HTTPStatus.BAD_REQUEST,
++    )
++
++
++class SerializedItemCache:
++    def __init__(self, max_bytes=ITEM_CACHE_MAX_BYTES):
++        self.max_bytes = max_bytes
++        self.lock = threading.Lock()
++        self.entries = OrderedDict()
++        self.size = 0
++        self.hits = 0
++        self.misses = 0
++
++    def fragments(self, rows):
++        fragments = [None] * len(rows)
++        missing = []
++        with self.lock:
++            for index, row in enumerate(rows):
++                entry = self.entries.get(row["id"])
++                if entry is not None and entry[0] == row["updated_at"]:
++                    self.entries.move_to_end(row["id"])
++                    fragments[index] = entry[1]
++                else:
++                    missing.append(index)
++            self.hits += len(rows) - len(missing)
++            self.misses += len(missing)
++        if not missing:
++            return fragments
++        for index in missing:
++            fragments[index] = json.dumps(serialize_item(rows[index])).encode("utf-8")
++        with self.lock:
++            for index in missing:
++                self.store(rows[index]["id"], rows[index]["updated_at"], fragments[index])
++        return fragments
++
++    def store(self, item_id, updated_at, fragment):
++        previous = self.entries.pop(item_id, None)
++        if previous is not None:
++            self.size -= len(previous[1])
++        self.entries[item_id] = (updated_at, fragment)
++        self.size += len(fragment)
++        while self.size > self.max_bytes and self.entries:
++            _, (_, evicted) = self.entries.popitem(last=False)
++            self.size -= len(evicted)
++
++    def invalidate(self, item_ids):
++        with self.lock:
++            for item_id in item_ids:
++                previous = self.entries.pop(item_id, None)
++                if previous is not None:
++                    self.size -= len(previous[1])
++
++
++def encode_json(value):
++    return json.dumps(value).encode("utf-8")
++
++
++def location_dashboard(location, deadline=None, items=True):
++    with location.pool.reader() as conn:
++        if deadline is not None:
++            conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
++        try:
++            cursor = conn.cursor()
++            cursor.execute("SELECT * FROM inventory_summary WHERE id = 1")
++            summary = dict(cursor.fetchone())
++            if items:
++                cursor.execute("SELECT * FROM inventory_items")
++            else:
++                cursor.execute("SELECT ii.* FROM stock_alerts sa CROSS JOIN inventory_items ii ON ii.id = sa.item_id")
++            rows = cursor.fetchall()
++            fragments = location.item_cache.fragments(rows)
++            fragments_by_id = {row["id"]: fragment for row, fragment in zip(rows, fragments)}
++            cursor.execute("SELECT item_id, status FROM stock_alerts ORDER BY item_id")
++            alerts = [(fragments_by_id.get(row["item_id"]), row["status"]) for row in cursor.fetchall()]
++            low_stock = [fragment for fragment, status in alerts if fragment is not None and status == "low"]
++            overstock = [fragment for fragment, status in alerts if fragment is not None and status == "overstock"]
++            cursor.execute(RECENT_USAGE_QUERY, (10,))
++            recent_usage = [dict(row) for row in cursor.fetchall()]
++            cursor.execute(RECENT_MOVEMENTS_QUERY, (10,))
++            movements = [dict(row) for row in cursor.fetchall()]
++        finally:
++            if deadline is not None:
++                conn.set_progress_handler(None, 0)
++    parts = [
++        ("total_value", encode_json(round(summary["total_value"], 2))),
++        ("total_units", encode_json(summary["total_units"])),
++    ]
++    if items:
++        parts.append(("items", join_fragments(fragments)))
++    parts += [
++        ("low_stock", join_fragments(low_stock)),
++        ("overstock", join_fragments(overstock)),
++        ("recent_usage", encode_json(recent_usage)),
++        ("movements", encode_json(movements)),
++    ]
++    return summary, parts
++
++
++def dashboard_sections(location, sections):
++    parts = []
++    with location.pool.reader() as conn:
++        cursor = conn.cursor()
++        for section in sections:
++            if section == "summary":
++                cursor.execute(
++                    "SELECT total_value, total_units, item_count, low_count, overstock_count FROM inventory_summary WHERE id = 1"
++                )
++                summary = dict(cursor.fetchone())
++                summary["total_value"] = round(summary["total_value"], 2)
++                value = encode_json(summary)
++            elif section == "chart":
++                cursor.execute("SELECT id, name, stock_level FROM inventory_items ORDER BY id")
++                rows = cursor.fetchall()
++                value = encode_json(
++                    {
++                        "ids": [row["id"] for row in rows],
++                        "names": [row["name"] for row in rows],
++                        "stock_levels": [row["stock_level"] for row in rows],
++                    }
++                )
++            elif section == "alerts":
++                cursor.execute("SELECT status, item_id FROM stock_alerts ORDER BY status, item_id")
++                alerts = {"low": [], "overstock": []}
++                for row in cursor.fetchall():
++                    alerts[row["status"]].append(row["item_id"])
++                value = encode_json(alerts)
++            elif section == "items":
++                cursor.execute("SELECT * FROM inventory_items ORDER BY id")
++                value = join_fragments(location.item_cache.fragments(cursor.fetchall()))
++            elif section == "recent_usage":
++                cursor.execute(RECENT_USAGE_QUERY, (10,))
++                value = encode_json([dict(row) for row in cursor.fetchall()])
++            else:
++                cursor.execute(RECENT_MOVEMENTS_QUERY, (10,))
++                value = encode_json([dict(row) for row in cursor.fetchall()])
++            parts.append((section, value))
++    return parts
++
++
++def join_fragments(fragments):
++    return b"[" + b", ".join(fragments) + b"]"
++
++
++def splice_json(parts):
++    return b"{" + b", ".join(encode_json(key) + b": " + value for key, value in parts) + b"}"
++
++
++def query_param(params, name, default=None):
++    return params.get(name, [default])[0]
++
++
++def parse_limit(params, default):
++    raw = query_param(params, "limit")
++    if raw is None:
++        return default
++    try:
++        limit = int(raw)
++    except ValueError:
++        raise ValueError("limit must be an integer")
++    if not 1 <= limit <= MAX_PAGE_SIZE:
++        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
++    return limit
++
++
++def parse_fields(params, allowed):
++    raw = query_param(params, "fields")
++    if not raw:
++        return None
++    fields = [field.strip() for field in raw.split(",") if field.strip()]
++    unknown = [field for field in fields if field not in allowed]
++    if unknown:
++        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
++    return fields
++
++
++def parse_sections(params):
++    raw = query_param(params, "sections")
++    if not raw:
++        return DASHBOARD_DEFAULT_SECTIONS
++    sections = [section.strip() for section in raw.split(",") if section.strip()]
++    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
++    if unknown:
++        raise ValueError(f"Unknown sections: {', '.join(unknown)}")
++    return tuple(dict.fromkeys(sections))
++
++
++def encode_cursor(values):
++    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
++
++
++def decode_cursor(token, size):
++    try:
++        values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
++    except (ValueError, UnicodeError):
++        raise ValueError("Invalid cursor")
++    if not isinstance(values, list) or len(values) != size:
++        raise ValueError("Invalid cursor")
++    *keys, last = values
++    if any(isinstance(key, bool) or not isinstance(key, (str, int, float, type(None))) for key in keys):
++        raise ValueError("Invalid cursor")
++    if isinstance(last, bool) or not isinstance(last, int):
++        raise ValueError("Invalid cursor")
++    return values
++
++
++def item_filters(params):
++    clauses = []
++    values = []
++    for column in ("barcode", "brand", "item_type"):
++        value = query_param(params, column)
++        if value:
++            clauses.append(f"ii.{column} = ?")
++            values.append(value)
++    status = query_param(params, "status")
++    if status:
++        if status not in ("low", "ok", "overstock"):
++            raise ValueError("status must be one of low, ok, overstock")
++        clauses.append(f"{stock_status_sql('ii')} = ?")
++        values.append(status)
++    prefix = query_param(params, "name_prefix")
++    if prefix:
++        clauses.append("ii.name >= ? AND ii.name < ?")
++        values.extend([prefix, prefix + "\U0010ffff"])
++    return clauses, values
++
++
++def search_expression(text):
++    terms = re.findall(r"\w+", text or "")
++    if not terms:
++        raise ValueError("q must contain at least one letter or digit")
++    if len(terms) > MAX_SEARCH_TERMS:
++        raise ValueError(f"q may contain at most {MAX_SEARCH_TERMS} terms")
++    return " ".join(f'"{term}"*' for term in terms)
++
++
++def project(record, fields):
++    if fields is None:
++        return record
++    return {field: record[field] for field in fields}
++
++
 +def add_movement(conn, item_id: int, change: int, reason: str):
 +    cursor = conn.cursor()
 +    cursor.execute(
@@ -166,40 +2224,395 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +def ensure_shopping_list_entry(conn, item_id: int):
 +    cursor = conn.cursor()
 +    cursor.execute("SELECT id FROM shopping_list WHERE item_id = ?", (item_id,))
-+    if cursor.fetchone() is None:
-+        cursor.execute(
-+            "INSERT INTO shopping_list (item_id, added_at) VALUES (?, ?)",
-+            (item_id, datetime.utcnow().isoformat()),
-+        )
++    if cursor.fetchone() is not None:
++        return False
++    cursor.execute(
++        "INSERT INTO shopping_list (item_id, added_at) VALUES (?, ?)",
++        (item_id, datetime.utcnow().isoformat()),
++    )
++    return True
 +
 +
 +def remove_shopping_list_entry(conn, item_id: int):
 +    cursor = conn.cursor()
 +    cursor.execute("DELETE FROM shopping_list WHERE item_id = ?", (item_id,))
++    return cursor.rowcount > 0
++
++
++def stock_events(row, new_stock, added=False, removed=False):
++    events = [
++        (
++            "item.stock",
++            {
++                "barcode": row["barcode"],
++                "stock_level": new_stock,
++                "status": stock_status(new_stock, row["min_stock"], row["max_stock"]),
++            },
++        )
++    ]
++    if added:
++        events.append(("shopping_list.added", {"barcode": row["barcode"]}))
++    if removed:
++        events.append(("shopping_list.removed", {"barcode": row["barcode"]}))
++    return events
++
++
++class EventHub:
++    def __init__(self, ring_size=EVENT_RING_SIZE, max_clients=EVENT_MAX_CLIENTS):
++        self.lock = threading.Lock()
++        self.ring = deque(maxlen=ring_size)
++        self.max_clients = max_clients
++        self.next_id = int(time.time() * 1000)
++        self.clients = {}
++        self.selector = None
++        self.wake_reader, self.wake_writer = socket.socketpair()
++        self.thread = None
++        self.running = False
++        self.relay = None
++
++    def publish(self, events):
++        if not events:
++            return
++        if self.relay is not None:
++            return self.relay(events)
++        self.deliver(events)
++
++    def deliver(self, events, first_id=None):
++        with self.lock:
++            if first_id is not None:
++                self.next_id = first_id
++            frames = []
++            for name, data in events:
++                frame = f"id: {self.next_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
++                self.ring.append((self.next_id, frame))
++                self.next_id += 1
++                frames.append(frame)
++            if not self.clients:
++                return
++            payload = b"".join(frames)
++            for buffer in self.clients.values():
++                buffer += payload
++        self.wake()
++
++    def backlog(self, last_event_id):
++        if last_event_id is None or last_event_id >= self.next_id - 1:
++            return b""
++        if self.ring and self.ring[0][0] <= last_event_id + 1:
++            return b"".join(frame for event_id, frame in self.ring if event_id > last_event_id)
++        return f"id: {self.next_id - 1}\nevent: reset\ndata: {{}}\n\n".encode("utf-8")
++
++    def subscribe(self, sock, last_event_id):
++        with self.lock:
++            if len(self.clients) >= self.max_clients:
++                return False
++            sock.setblocking(False)
++            self.clients[sock] = bytearray(b"retry: 3000\n\n" + self.backlog(last_event_id))
++            self.start()
++        self.wake()
++        return True
++
++    def wake(self):
++        try:
++            self.wake_writer.send(b"\0")
++        except (BlockingIOError, OSError):
++            pass
++
++    def start(self):
++        if self.running:
++            return
++        self.running = True
++        self.wake_writer.setblocking(False)
++        self.selector = selectors.DefaultSelector()
++        self.selector.register(self.wake_reader, selectors.EVENT_READ)
++        self.thread = threading.Thread(target=self.run, name="event-hub", daemon=True)
++        self.thread.start()
++
++    def run(self):
++        registered = {}
++        next_heartbeat = time.monotonic() + EVENT_HEARTBEAT_SECONDS
++        while self.running:
++            for key, mask in self.selector.select(timeout=max(next_heartbeat - time.monotonic(), 0)):
++                if key.fileobj is self.wake_reader:
++                    self.wake_reader.recv(4096)
++                elif mask & selectors.EVENT_READ:
++                    try:
++                        data = key.fileobj.recv(4096)
++                    except BlockingIOError:
++                        continue
++                    except OSError:
++                        data = b""
++                    if not data:
++                        self.drop(key.fileobj)
++            with self.lock:
++                if time.monotonic() >= next_heartbeat:
++                    next_heartbeat = time.monotonic() + EVENT_HEARTBEAT_SECONDS
++                    for buffer in self.clients.values():
++                        buffer += b": ping\n\n"
++                clients = list(self.clients.items())
++            for sock, buffer in clients:
++                if not self.flush(sock, buffer):
++                    self.drop(sock)
++                    if sock not in registered:
++                        sock.close()
++                    continue
++                with self.lock:
++                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if buffer else 0)
++                if sock not in registered:
++                    self.selector.register(sock, events)
++                elif registered[sock] != events:
++                    self.selector.modify(sock, events)
++                registered[sock] = events
++            for sock in [sock for sock in registered if sock not in self.clients]:
++                self.selector.unregister(sock)
++                del registered[sock]
++                sock.close()
++
++    def flush(self, sock, buffer):
++        with self.lock:
++            if len(buffer) > EVENT_CLIENT_BUFFER_BYTES:
++                return False
++            pending = bytes(buffer)
++        if not pending:
++            return True
++        try:
++            sent = sock.send(pending)
++        except BlockingIOError:
++            return True
++        except OSError:
++            return False
++        with self.lock:
++            del buffer[:sent]
++        return True
++
++    def drop(self, sock):
++        with self.lock:
++            self.clients.pop(sock, None)
++
++    def close(self):
++        self.running = False
++        self.wake()
++        if self.thread is not None:
++            self.thread.join(2)
++        with self.lock:
++            clients, self.clients = list(self.clients), {}
++        for sock in clients:
++            sock.close()
++
++
++LOCATIONS = configure_locations()
++GROUP_EXECUTOR = ThreadPoolExecutor(max_workers=max(GROUP_WORKERS, 1), thread_name_prefix="group")
++
++
++class StaticAssetCache:
++    def __init__(self, max_file_bytes=STATIC_CACHE_MAX_FILE_BYTES):
++        self.max_file_bytes = max_file_bytes
++        self.lock = threading.Lock()
++        self.entries = {}
++
++    def get(self, target):
++        stat = target.stat()
++        with self.lock:
++            entry = self.entries.get(target)
++        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
++            return entry
++        entry = {
++            "mtime_ns": stat.st_mtime_ns,
++            "size": stat.st_size,
++            "content_type": STATIC_CONTENT_TYPES.get(target.suffix, "application/octet-stream"),
++            "etag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
++            "gzip_etag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-gz"',
++            "last_modified": formatdate(stat.st_mtime, usegmt=True),
++            "data": None,
++            "gzip": None,
++        }
++        if stat.st_size <= self.max_file_bytes:
++            with open(target, "rb") as file_obj:
++                entry["data"] = file_obj.read()
++            if target.suffix in COMPRESSIBLE_SUFFIXES and stat.st_size >= GZIP_MIN_BYTES:
++                entry["gzip"] = gzip.compress(entry["data"], compresslevel=9)
++        with self.lock:
++            self.entries[target] = entry
++        return entry
++
++
++STATIC_ASSETS = StaticAssetCache()
++
++
++def busy_response(method):
++    def handle(self):
++        try:
++            return method(self)
++        except sqlite3.OperationalError as exc:
++            if self.status_code is not None or "locked" not in str(exc):
++                raise
++            error_response(self, "Database is busy, please retry", HTTPStatus.SERVICE_UNAVAILABLE)
++
++    return handle
 +
 +
 +class InventoryRequestHandler(BaseHTTPRequestHandler):
 +    server_version = "InventoryServer/1.0"
++    protocol_version = "HTTP/1.1"
++    timeout = KEEPALIVE_TIMEOUT
++    disable_nagle_algorithm = True
++    interim = False
++    clock = None
++    parked = False
++    detached = False
 +
 +    def do_OPTIONS(self):  # pragma: no cover - placeholder for future extension
 +        self.send_response(HTTPStatus.NO_CONTENT)
 +        self.send_header("Allow", "GET, POST, PUT, OPTIONS")
 +        self.send_header("Access-Control-Allow-Origin", "*")
 +        self.send_header("Access-Control-Allow-Methods", "GET, POST, PUT, OPTIONS")
-+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
++        self.send_header("Access-Control-Allow-Headers", "Content-Type, X-Location")
 +        self.end_headers()
 +
++    def handle(self):
++        self.requests_served = 0
++        self.serve()
++
++    def serve(self):
++        # Answer the requests already on the wire, then hand an idle keep-alive
++        # connection to the server's IdleConnections instead of blocking a worker on it.
++        self.parked = False
++        self.handle_one_request()
++        while not self.close_connection and not self.detached:
++            if not self.request_waiting():
++                self.parked = True
++                return
++            self.handle_one_request()
++
++    def resume(self):
++        try:
++            self.serve()
++        finally:
++            self.finish()
++
++    def finish(self):
++        if not self.parked:
++            super().finish()
++
++    def request_waiting(self):
++        self.connection.settimeout(0)
++        try:
++            return bool(self.rfile.peek(1))
++        except OSError:
++            return False
++        finally:
++            self.connection.settimeout(self.timeout)
++
++    def handle_one_request(self):
++        self.command = self.path = ""
++        self.status_code = None
++        self.response_bytes = 0
++        self.body_read = 0
++        self.started = None
++        try:
++            super().handle_one_request()
++            if self.started is not None:
++                self.discard_body()
++        finally:
++            if self.started is not None:
++                METRICS.end_request(
++                    self.command, self.path, self.status_code, time.perf_counter() - self.started, self.response_bytes
++                )
++        self.requests_served += 1
++
++    def parse_request(self):
++        self.started = time.perf_counter()
++        METRICS.begin_request()
++        return super().parse_request()
++
++    def unread_body(self):
++        if self.headers.get("Transfer-Encoding"):
++            return None
++        try:
++            return content_length(self) - self.body_read
++        except ValueError:
++            return None
++
++    def discard_body(self):
++        if self.close_connection:
++            return
++        remaining = self.unread_body()
++        if remaining is None or remaining > KEEPALIVE_MAX_DRAIN_BYTES:
++            self.close_connection = True
++            return
++        while remaining > 0:
++            chunk = self.rfile.read(min(remaining, KEEPALIVE_MAX_DRAIN_BYTES))
++            if not chunk:
++                self.close_connection = True
++                return
++            remaining -= len(chunk)
++
++    def handle_expect_100(self):
++        self.interim = True
++        try:
++            return super().handle_expect_100()
++        finally:
++            self.interim = False
++
++    def end_headers(self):
++        # The connection decision belongs to the final response, not to 100 Continue.
++        if not self.close_connection and not self.interim:
++            remaining = self.unread_body()
++            if (
++                self.requests_served + 1 >= KEEPALIVE_MAX_REQUESTS
++                or remaining is None
++                or remaining > KEEPALIVE_MAX_DRAIN_BYTES
++            ):
++                self.send_header("Connection", "close")
++            else:
++                self.send_header("Keep-Alive", f"timeout={KEEPALIVE_TIMEOUT:g}, max={KEEPALIVE_MAX_REQUESTS - self.requests_served - 1}")
++        super().end_headers()
++
++    def send_response(self, code, message=None):
++        self.status_code = int(code)
++        super().send_response(code, message)
++
++    def send_header(self, keyword, value):
++        if keyword == "Content-Length":
++            self.response_bytes = int(value)
++        super().send_header(keyword, value)
++
++    def route_location(self):
++        name = self.headers.get("X-Location") or DEFAULT_LOCATION
++        if self.path.startswith("/locations/"):
++            name, _, rest = self.path[len("/locations/"):].partition("/")
++            self.path = "/" + rest
++        self.location = LOCATIONS.get(name)
++        if self.location is None:
++            error_response(self, f"Unknown location {name}", HTTPStatus.NOT_FOUND)
++            return False
++        return True
++
++    @busy_response
 +    def do_GET(self):
++        self.etag = None
++        if not self.route_location():
++            return None
 +        parsed = urlparse(self.path)
 +        if parsed.path.startswith("/api/"):
 +            self.handle_api_get(parsed)
 +        else:
 +            self.serve_static(parsed.path)
 +
++    @busy_response
 +    def do_POST(self):
++        if not self.route_location():
++            return None
 +        parsed = urlparse(self.path)
 +        if not parsed.path.startswith("/api/"):
 +            return error_response(self, "Unsupported endpoint", HTTPStatus.NOT_FOUND)
++        if parsed.path in ("/api/items/bulk", "/api/items/adjust/bulk"):
++            try:
++                rows = parse_bulk_rows(self)
++            except ValueError as exc:
++                return error_response(self, str(exc))
++            if parsed.path == "/api/items/bulk":
++                return self.create_items_bulk(rows)
++            return self.adjust_items_bulk(rows)
 +        try:
 +            payload = parse_request_body(self)
 +        except ValueError as exc:
@@ -212,7 +2625,10 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +            return self.record_usage(payload)
 +        return error_response(self, "Unknown endpoint", HTTPStatus.NOT_FOUND)
 +
++    @busy_response
 +    def do_PUT(self):
++        if not self.route_location():
++            return None
 +        parsed = urlparse(self.path)
 +        if parsed.path == "/api/items":
 +            try:
@@ -232,194 +2648,432 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +                target = STATIC_DIR / "index.html"
 +        if not target.exists():
 +            return error_response(self, "Static asset not found", HTTPStatus.NOT_FOUND)
-+        if target.suffix == ".html":
-+            content_type = "text/html; charset=utf-8"
-+        elif target.suffix == ".css":
-+            content_type = "text/css; charset=utf-8"
-+        elif target.suffix == ".js":
-+            content_type = "application/javascript; charset=utf-8"
-+        elif target.suffix == ".json":
-+            content_type = "application/json; charset=utf-8"
-+        elif target.suffix in {".png", ".jpg", ".jpeg", ".gif", ".svg"}:
-+            content_type = f"image/{target.suffix.lstrip('.')}"
-+        elif target.suffix == ".ico":
-+            content_type = "image/x-icon"
-+        else:
-+            content_type = "application/octet-stream"
-+        with open(target, "rb") as file_obj:
-+            data = file_obj.read()
++        asset = STATIC_ASSETS.get(target)
++        cache_control = "no-cache" if target.suffix == ".html" else f"public, max-age={STATIC_MAX_AGE}"
++        body = asset["data"]
++        etag = asset["etag"]
++        use_gzip = asset["gzip"] is not None and accepts_gzip(self.headers)
++        if use_gzip:
++            body = asset["gzip"]
++            etag = asset["gzip_etag"]
++        if self.static_not_modified(asset, etag):
++            self.send_response(HTTPStatus.NOT_MODIFIED)
++            self.send_header("ETag", etag)
++            self.send_header("Last-Modified", asset["last_modified"])
++            self.send_header("Cache-Control", cache_control)
++            if target.suffix in COMPRESSIBLE_SUFFIXES:
++                self.send_header("Vary", "Accept-Encoding")
++            self.end_headers()
++            return None
 +        self.send_response(HTTPStatus.OK)
-+        self.send_header("Content-Type", content_type)
-+        self.send_header("Content-Length", str(len(data)))
++        self.send_header("Content-Type", asset["content_type"])
++        self.send_header("Content-Length", str(len(body) if body is not None else asset["size"]))
++        self.send_header("ETag", etag)
++        self.send_header("Last-Modified", asset["last_modified"])
++        self.send_header("Cache-Control", cache_control)
++        if target.suffix in COMPRESSIBLE_SUFFIXES:
++            self.send_header("Vary", "Accept-Encoding")
++        if use_gzip:
++            self.send_header("Content-Encoding", "gzip")
 +        self.end_headers()
-+        self.wfile.write(data)
++        if body is not None:
++            self.wfile.write(body)
++            return None
++        with open(target, "rb") as file_obj:
++            self.connection.sendfile(file_obj)
++        return None
++
++    def static_not_modified(self, asset, etag):
++        if_none_match = self.headers.get("If-None-Match")
++        if if_none_match:
++            return etag_matches(if_none_match, etag)
++        if_modified_since = self.headers.get("If-Modified-Since")
++        if not if_modified_since:
++            return False
++        try:
++            since = parsedate_to_datetime(if_modified_since).timestamp()
++        except (TypeError, ValueError):
++            return False
++        return int(asset["mtime_ns"] // 1_000_000_000) <= since
 +
 +    def handle_api_get(self, parsed):
++        if parsed.path == "/api/events":
++            return self.stream_events(parsed)
++        if parsed.path == "/api/metrics":
++            return self.get_metrics()
++        if parsed.path.startswith("/api/export/"):
++            return self.export(parsed)
++        if parsed.path == "/api/group/dashboard":
++            return self.group_dashboard()
++        self.clock = self.response_clock(parsed)
++        if self.not_modified():
++            return None
 +        if parsed.path == "/api/items":
-+            return self.list_items()
++            return self.list_items(parsed)
 +        if parsed.path == "/api/dashboard":
 +            return self.dashboard_summary()
++        if parsed.path == "/api/v2/dashboard":
++            return self.dashboard_v2(parsed)
 +        if parsed.path == "/api/shopping-list":
-+            return self.get_shopping_list()
++            return self.get_shopping_list(parsed)
 +        if parsed.path == "/api/activity":
-+            return self.get_activity()
++            return self.get_activity(parsed)
++        if parsed.path == "/api/stock-at":
++            return self.get_stock_at(parsed)
++        if parsed.path == "/api/search":
++            return self.search(parsed)
++        if parsed.path == "/api/items/history":
++            return self.get_history(parsed)
++        if parsed.path.startswith("/api/items/") and parsed.path.endswith("/history"):
++            return self.get_history(parsed, unquote(parsed.path[len("/api/items/") : -len("/history")]))
 +        return error_response(self, "Unknown endpoint", HTTPStatus.NOT_FOUND)
 +
-+    def list_items(self):
-+        conn = get_connection()
++    def get_history(self, parsed, barcode=None):
++        params = parse_qs(parsed.query)
++        today = self.clock
 +        try:
++            start = query_param(params, "from")
++            end = query_param(params, "to")
++            start = parse_timestamp(start, "from") if start else None
++            end = parse_timestamp(end, "to") if end else None
++            if end is not None and start is not None and end <= start:
++                raise ValueError("to must be after from")
++            try:
++                points = int(query_param(params, "points", HISTORY_DEFAULT_POINTS))
++            except ValueError:
++                raise ValueError("points must be an integer")
++            if not 3 <= points <= HISTORY_MAX_POINTS:
++                raise ValueError(f"points must be between 3 and {HISTORY_MAX_POINTS}")
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        with self.location.pool.reader() as conn:
 +            cursor = conn.cursor()
-+            cursor.execute("SELECT * FROM inventory_items ORDER BY name")
-+            items = [serialize_item(row) for row in cursor.fetchall()]
-+            json_response(self, {"items": items})
-+        finally:
-+            conn.close()
++            if start is None:
++                # The default window starts no earlier than pruned history; only an
++                # explicit from inside the pruned range is answered with 410.
++                start = (today - timedelta(days=HISTORY_DEFAULT_DAYS)).isoformat()
++                cutoff = pruned_before(cursor)
++                if cutoff is not None and start < cutoff and (end is None or cutoff < end):
++                    start = cutoff
++                if end is not None and end <= start:
++                    return error_response(self, "to must be after from")
++            item = None
++            if barcode is not None:
++                cursor.execute("SELECT id, barcode, name, stock_level FROM inventory_items WHERE barcode = ?", (barcode,))
++                item = cursor.fetchone()
++                if not item:
++                    return error_response(self, "Item not found", HTTPStatus.NOT_FOUND)
++                cursor.execute("SELECT MAX(id) FROM inventory_movements WHERE item_id = ?", (item["id"],))
++            else:
++                end = end or (today + timedelta(days=1)).isoformat()
++                cursor.execute("SELECT MAX(id) FROM inventory_movements")
++            version = cursor.fetchone()[0]
++            key = (item["id"] if item else None, start, end, points)
++            series = self.location.history.get(key, version)
++            if series is None:
++                try:
++                    if item:
++                        series = item_history(cursor, item, start, end, points)
++                    else:
++                        series = items_history(cursor, start, end, points)
++                except LookupError as exc:
++                    return error_response(self, str(exc), HTTPStatus.GONE)
++                self.location.history.put(key, version, series)
++        if item is None:
++            return json_response(self, {"from": start, "to": end, "points": series})
++        if end is None:
++            series = series + [{"at": datetime.utcnow().isoformat(), "stock_level": item["stock_level"]}]
++        json_response(
++            self,
++            {"barcode": item["barcode"], "name": item["name"], "from": start, "to": end, "points": series},
++        )
 +
-+    def create_item(self, payload):
-+        required = {
-+            "barcode",
-+            "name",
-+            "brand",
-+            "item_type",
-+            "attributes",
-+            "unit_size",
-+            "total_cost",
-+            "stock_level",
-+            "min_stock",
-+            "max_stock",
-+        }
-+        missing = [field for field in required if field not in payload]
-+        if missing:
-+            return error_response(self, f"Missing fields: {', '.join(missing)}")
++    def stream_events(self, parsed):
++        last_event_id = self.headers.get("Last-Event-ID") or parse_qs(parsed.query).get("last_event_id", [None])[0]
 +        try:
-+            stock_level = int(payload["stock_level"])
-+            min_stock = int(payload["min_stock"])
-+            max_stock = int(payload["max_stock"])
-+            total_cost = float(payload["total_cost"])
-+        except (TypeError, ValueError):
-+            return error_response(self, "Invalid numeric values provided")
-+        if stock_level <= 0:
-+            return error_response(self, "Stock level must be greater than zero")
-+        if min_stock < 0 or max_stock <= 0 or max_stock < min_stock:
-+            return error_response(self, "Invalid stock thresholds")
-+        unit_cost = round(total_cost / stock_level, 4)
-+        attributes = payload["attributes"]
-+        if isinstance(attributes, dict):
-+            attributes_json = json.dumps(attributes)
-+        else:
-+            return error_response(self, "Attributes must be an object")
-+        conn = get_connection()
++            last_event_id = int(last_event_id) if last_event_id else None
++        except ValueError:
++            return error_response(self, "Last-Event-ID must be an integer")
++        if len(self.location.events.clients) >= self.location.events.max_clients:
++            return error_response(self, "Too many event subscribers", HTTPStatus.SERVICE_UNAVAILABLE)
++        self.send_response(HTTPStatus.OK)
++        self.send_header("Content-Type", "text/event-stream")
++        self.send_header("Cache-Control", "no-cache")
++        self.send_header("Connection", "close")
++        self.send_header("X-Accel-Buffering", "no")
++        self.end_headers()
++        self.wfile.flush()
++        if self.location.events.subscribe(self.connection, last_event_id):
++            self.detached = True
++        self.close_connection = True
++        return None
++
++    def response_clock(self, parsed):
++        # Responses computed from the current time are evaluated at a truncated
++        # instant that is also part of the ETag, so cached copies expire with it.
++        if parsed.path == "/api/shopping-list" and query_param(parse_qs(parsed.query), "mode") == "predicted":
++            return datetime.utcnow().replace(minute=0, second=0, microsecond=0)
++        if parsed.path.startswith("/api/items/") and parsed.path.endswith("/history"):
++            params = parse_qs(parsed.query)
++            if not (query_param(params, "from") and query_param(params, "to")):
++                return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
++        return None
++
++    def not_modified(self):
++        with self.location.pool.reader() as conn:
++            version = current_data_version(conn)
++        self.etag = f'W/"{self.location.name}-{version}"'
++        if self.clock is not None:
++            self.etag = f'W/"{self.location.name}-{version}-{self.clock:%Y%m%dT%H}"'
++        if not etag_matches(self.headers.get("If-None-Match"), self.etag):
++            return False
++        self.send_response(HTTPStatus.NOT_MODIFIED)
++        self.send_header("ETag", self.etag)
++        self.send_header("Cache-Control", "no-cache")
++        self.send_header("Vary", "Accept-Encoding, X-Location")
++        self.end_headers()
++        return True
++
++    def list_items(self, parsed):
++        params = parse_qs(parsed.query)
 +        try:
++            limit = parse_limit(params, ITEMS_PAGE_SIZE)
++            fields = parse_fields(params, ITEM_FIELDS)
++            clauses, values = item_filters(params)
++            if query_param(params, "cursor"):
++                clauses.append("(ii.name, ii.id) > (?, ?)")
++                values.extend(decode_cursor(query_param(params, "cursor"), 2))
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        with self.location.pool.reader() as conn:
 +            cursor = conn.cursor()
-+            now = datetime.utcnow().isoformat()
-+            cursor.execute(
-+                """
-+                INSERT INTO inventory_items (
-+                    barcode, name, brand, item_type, attributes, unit_size,
-+                    unit_cost, stock_level, min_stock, max_stock, created_at, updated_at
-+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-+                """,
-+                (
-+                    payload["barcode"],
-+                    payload["name"],
-+                    payload["brand"],
-+                    payload["item_type"],
-+                    attributes_json,
-+                    payload["unit_size"],
-+                    unit_cost,
-+                    stock_level,
-+                    min_stock,
-+                    max_stock,
-+                    now,
-+                    now,
-+                ),
-+            )
-+            item_id = cursor.lastrowid
-+            add_movement(conn, item_id, stock_level, "Initial stock")
-+            conn.commit()
++            cursor.execute(ITEMS_PAGE_QUERY.format(filters=" AND ".join(clauses) or "1"), (*values, limit + 1))
++            rows = cursor.fetchall()
++        next_cursor = None
++        if len(rows) > limit:
++            next_cursor = encode_cursor([rows[limit - 1]["name"], rows[limit - 1]["id"]])
++        if fields is not None:
++            items = [project(serialize_item(row), fields) for row in rows[:limit]]
++            return json_response(self, {"items": items, "next_cursor": next_cursor})
++        items = join_fragments(self.location.item_cache.fragments(rows[:limit]))
++        json_bytes_response(self, splice_json([("items", items), ("next_cursor", encode_json(next_cursor))]))
++
++    def create_item(self, payload):
++        try:
++            item = validate_new_item(payload)
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        try:
++            with self.location.pool.writer() as conn:
++                self.location.pool.barcodes.invalidate([item["barcode"]])
++                insert_items(conn, [item])
 +        except sqlite3.IntegrityError:
-+            conn.rollback()
 +            return error_response(self, "Item with the provided barcode already exists", HTTPStatus.CONFLICT)
-+        finally:
-+            conn.close()
++        self.location.events.publish(
++            [
++                (
++                    "item.created",
++                    {
++                        "barcode": item["barcode"],
++                        "name": item["name"],
++                        "stock_level": item["stock_level"],
++                        "status": stock_status(item["stock_level"], item["min_stock"], item["max_stock"]),
++                    },
++                )
++            ]
++        )
 +        json_response(self, {"message": "Item created successfully"}, HTTPStatus.CREATED)
 +
-+    def adjust_item(self, payload):
-+        for field in ("barcode", "delta", "reason"):
-+            if field not in payload:
-+                return error_response(self, f"Missing field: {field}")
++    def create_items_bulk(self, rows):
++        results = []
++        items = []
++        seen = set()
++        for index, row in enumerate(rows, start=1):
++            try:
++                item = validate_new_item(row)
++                if item["barcode"] in seen:
++                    raise ValueError("Duplicate barcode in upload")
++            except ValueError as exc:
++                results.append({"row": index, "status": "error", "error": str(exc)})
++                continue
++            seen.add(item["barcode"])
++            items.append((index, item))
 +        try:
-+            delta = int(payload["delta"])
-+        except (TypeError, ValueError):
-+            return error_response(self, "Delta must be an integer")
-+        if delta == 0:
-+            return error_response(self, "Delta cannot be zero")
-+        conn = get_connection()
++            return self.insert_items_bulk(rows, items, results)
++        except sqlite3.IntegrityError as exc:
++            return error_response(self, f"Rows rejected by the database: {exc}", HTTPStatus.CONFLICT)
++
++    def insert_items_bulk(self, rows, items, results):
++        with self.location.pool.writer() as conn:
++            existing = fetch_items_by_barcode(conn.cursor(), [item["barcode"] for _, item in items])
++            for index, item in items:
++                if item["barcode"] in existing:
++                    error = "Item with the provided barcode already exists"
++                    results.append({"row": index, "barcode": item["barcode"], "status": "error", "error": error})
++                else:
++                    results.append({"row": index, "barcode": item["barcode"], "status": "created"})
++            results.sort(key=lambda result: result["row"])
++            if len(items) != len(rows) or existing:
++                conn.rollback()
++                return bulk_error_response(self, results)
++            self.location.pool.barcodes.invalidate([item["barcode"] for _, item in items])
++            insert_items(conn, [item for _, item in items])
++        self.location.events.publish([("items.imported", {"count": len(items)})])
++        json_response(self, {"message": f"Created {len(items)} items", "results": results}, HTTPStatus.CREATED)
++
++    def adjust_item(self, payload):
 +        try:
++            adjustment = validate_adjustment(payload)
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        delta = adjustment["delta"]
++
++        def apply(conn):
 +            cursor = conn.cursor()
-+            cursor.execute("SELECT * FROM inventory_items WHERE barcode = ?", (payload["barcode"],))
-+            row = cursor.fetchone()
++            barcode = adjustment["barcode"]
++            row = self.location.pool.barcodes.lookup(cursor, [barcode]).get(barcode)
 +            if row is None:
-+                return error_response(self, "Item not found", HTTPStatus.NOT_FOUND)
-+            new_stock = row["stock_level"] + delta
-+            if new_stock < 0:
-+                return error_response(self, "Insufficient stock for the adjustment", HTTPStatus.CONFLICT)
-+            now = datetime.utcnow().isoformat()
++                raise WriteRejected("Item not found", HTTPStatus.NOT_FOUND)
++            self.location.pool.barcodes.invalidate([row["barcode"]])
 +            cursor.execute(
 +                """
 +                UPDATE inventory_items
-+                SET stock_level = ?, updated_at = ?
-+                WHERE id = ?
++                SET stock_level = stock_level + ?, updated_at = ?
++                WHERE id = ? AND stock_level + ? >= 0
++                RETURNING *
 +                """,
-+                (new_stock, now, row["id"]),
++                (delta, datetime.utcnow().isoformat(), row["id"], delta),
 +            )
-+            add_movement(conn, row["id"], delta, payload["reason"])
++            updated = cursor.fetchone()
++            if updated is None:
++                raise WriteRejected("Insufficient stock for the adjustment", HTTPStatus.CONFLICT)
++            self.location.pool.barcodes.stage(updated)
++            new_stock = updated["stock_level"]
++            add_movement(conn, row["id"], delta, adjustment["reason"])
 +            if new_stock == 0:
-+                ensure_shopping_list_entry(conn, row["id"])
-+            else:
-+                remove_shopping_list_entry(conn, row["id"])
-+            conn.commit()
-+        finally:
-+            conn.close()
++                return row, new_stock, stock_events(row, new_stock, added=ensure_shopping_list_entry(conn, row["id"]))
++            return row, new_stock, stock_events(row, new_stock, removed=remove_shopping_list_entry(conn, row["id"]))
++
++        try:
++            row, new_stock, events = self.location.writes.submit(apply)
++        except WriteRejected as exc:
++            return error_response(self, str(exc), exc.status)
++        self.location.item_cache.invalidate([row["id"]])
++        self.location.events.publish(events)
 +        json_response(self, {"message": "Stock adjusted", "new_stock": new_stock})
 +
++    def adjust_items_bulk(self, rows):
++        results = []
++        adjustments = []
++        for index, row in enumerate(rows, start=1):
++            try:
++                adjustments.append((index, validate_adjustment(row)))
++            except ValueError as exc:
++                results.append({"row": index, "status": "error", "error": str(exc)})
++        try:
++            return self.apply_adjustments_bulk(adjustments, results)
++        except sqlite3.IntegrityError as exc:
++            return error_response(self, f"Rows rejected by the database: {exc}", HTTPStatus.CONFLICT)
++
++    def apply_adjustments_bulk(self, adjustments, results):
++        with self.location.pool.writer() as conn:
++            cursor = conn.cursor()
++            items = fetch_items_by_barcode(cursor, [adjustment["barcode"] for _, adjustment in adjustments])
++            stock = {barcode: row["stock_level"] for barcode, row in items.items()}
++            for index, adjustment in adjustments:
++                barcode = adjustment["barcode"]
++                if barcode not in items:
++                    results.append({"row": index, "barcode": barcode, "status": "error", "error": "Item not found"})
++                    continue
++                new_stock = stock[barcode] + adjustment["delta"]
++                if new_stock < 0:
++                    error = "Insufficient stock for the adjustment"
++                    results.append({"row": index, "barcode": barcode, "status": "error", "error": error})
++                    continue
++                stock[barcode] = new_stock
++                results.append({"row": index, "barcode": barcode, "status": "adjusted", "new_stock": new_stock})
++            results.sort(key=lambda result: result["row"])
++            if any(result["status"] == "error" for result in results):
++                conn.rollback()
++                return bulk_error_response(self, results)
++            self.location.pool.barcodes.invalidate(items)
++            now = datetime.utcnow().isoformat()
++            cursor.executemany(
++                "UPDATE inventory_items SET stock_level = stock_level + ?, updated_at = ? WHERE id = ?",
++                [(adjustment["delta"], now, items[adjustment["barcode"]]["id"]) for _, adjustment in adjustments],
++            )
++            cursor.executemany(
++                "INSERT INTO inventory_movements (item_id, change_amount, reason, created_at) VALUES (?, ?, ?, ?)",
++                [
++                    (items[adjustment["barcode"]]["id"], adjustment["delta"], adjustment["reason"], now)
++                    for _, adjustment in adjustments
++                ],
++            )
++            changes = [(row, stock[barcode]) for barcode, row in items.items()]
++            added, removed = sync_shopping_list(cursor, changes, now)
++            events = [("items.adjusted", {"count": len(adjustments)})]
++            events += [("shopping_list.added", {"barcode": row["barcode"]}) for row, _ in changes if row["id"] in added]
++            events += [("shopping_list.removed", {"barcode": row["barcode"]}) for row, _ in changes if row["id"] in removed]
++        self.location.item_cache.invalidate([row["id"] for row in items.values()])
++        self.location.events.publish(events)
++        json_response(self, {"message": f"Applied {len(adjustments)} adjustments", "results": results})
++
 +    def record_usage(self, payload):
 +        required = {"client_name", "usage_date", "before_state", "after_state", "items"}
 +        missing = [field for field in required if field not in payload]
 +        if missing:
 +            return error_response(self, f"Missing fields: {', '.join(missing)}")
++        try:
++            require_text(payload, ("client_name", "usage_date", "before_state", "after_state"))
++        except ValueError as exc:
++            return error_response(self, str(exc))
 +        items = payload["items"]
 +        if not isinstance(items, list) or not items:
 +            return error_response(self, "Items must be a non-empty list")
-+        conn = get_connection()
-+        try:
++        entries = []
++        totals = {}
++        for entry in items:
++            if not isinstance(entry, dict) or "barcode" not in entry or "amount" not in entry:
++                return error_response(self, "Each usage item must include barcode and amount")
++            try:
++                barcode = normalize_barcode(entry["barcode"])
++            except ValueError as exc:
++                return error_response(self, str(exc))
++            try:
++                amount = int(entry["amount"])
++            except (TypeError, ValueError):
++                return error_response(self, "Item amount must be an integer")
++            if amount <= 0:
++                return error_response(self, "Item amount must be greater than zero")
++            entries.append((barcode, amount))
++            totals[barcode] = totals.get(barcode, 0) + amount
++
++        def apply(conn):
 +            cursor = conn.cursor()
-+            cost_total = 0.0
-+            item_updates = []
-+            for entry in items:
-+                if "barcode" not in entry or "amount" not in entry:
-+                    conn.rollback()
-+                    return error_response(self, "Each usage item must include barcode and amount")
-+                try:
-+                    amount = int(entry["amount"])
-+                except (TypeError, ValueError):
-+                    conn.rollback()
-+                    return error_response(self, "Item amount must be an integer")
-+                if amount <= 0:
-+                    conn.rollback()
-+                    return error_response(self, "Item amount must be greater than zero")
-+                cursor.execute("SELECT * FROM inventory_items WHERE barcode = ?", (entry["barcode"],))
-+                item_row = cursor.fetchone()
-+                if item_row is None:
-+                    conn.rollback()
-+                    return error_response(self, f"Item with barcode {entry['barcode']} not found", HTTPStatus.NOT_FOUND)
-+                if item_row["stock_level"] < amount:
-+                    conn.rollback()
-+                    return error_response(self, f"Insufficient stock for {item_row['name']}", HTTPStatus.CONFLICT)
-+                cost = amount * item_row["unit_cost"]
-+                cost_total += cost
-+                item_updates.append((item_row, amount, cost))
++            rows = self.location.pool.barcodes.lookup(cursor, list(totals))
++            for barcode in totals:
++                if barcode not in rows:
++                    raise WriteRejected(f"Item with barcode {barcode} not found", HTTPStatus.NOT_FOUND)
++            self.location.pool.barcodes.invalidate(totals)
 +            now = datetime.utcnow().isoformat()
++            stock = {}
++            for barcode, amount in totals.items():
++                cursor.execute(
++                    """
++                    UPDATE inventory_items
++                    SET stock_level = stock_level - ?, updated_at = ?
++                    WHERE id = ? AND stock_level >= ?
++                    RETURNING *
++                    """,
++                    (amount, now, rows[barcode]["id"], amount),
++                )
++                updated = cursor.fetchone()
++                if updated is None:
++                    raise WriteRejected(f"Insufficient stock for {rows[barcode]['name']}", HTTPStatus.CONFLICT)
++                self.location.pool.barcodes.stage(updated)
++                stock[barcode] = updated["stock_level"]
++            costs = [(barcode, amount, amount * rows[barcode]["unit_cost"]) for barcode, amount in entries]
++            cost_total = sum(cost for _, _, cost in costs)
 +            cursor.execute(
 +                """
 +                INSERT INTO usage_records (client_name, usage_date, before_state, after_state, total_cost, created_at)
@@ -435,31 +3089,28 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +                ),
 +            )
 +            usage_id = cursor.lastrowid
-+            for item_row, amount, cost in item_updates:
-+                new_stock = item_row["stock_level"] - amount
-+                cursor.execute(
-+                    """
-+                    UPDATE inventory_items
-+                    SET stock_level = ?, updated_at = ?
-+                    WHERE id = ?
-+                    """,
-+                    (new_stock, now, item_row["id"]),
-+                )
-+                cursor.execute(
-+                    """
-+                    INSERT INTO usage_items (usage_id, item_id, amount_used, cost)
-+                    VALUES (?, ?, ?, ?)
-+                    """,
-+                    (usage_id, item_row["id"], amount, round(cost, 2)),
-+                )
-+                add_movement(conn, item_row["id"], -amount, f"Usage: {payload['client_name']}")
-+                if new_stock == 0:
-+                    ensure_shopping_list_entry(conn, item_row["id"])
-+                else:
-+                    remove_shopping_list_entry(conn, item_row["id"])
-+            conn.commit()
-+        finally:
-+            conn.close()
++            cursor.executemany(
++                "INSERT INTO usage_items (usage_id, item_id, amount_used, cost) VALUES (?, ?, ?, ?)",
++                [(usage_id, rows[barcode]["id"], amount, round(cost, 2)) for barcode, amount, cost in costs],
++            )
++            reason = f"Usage: {payload['client_name']}"
++            cursor.executemany(
++                "INSERT INTO inventory_movements (item_id, change_amount, reason, created_at) VALUES (?, ?, ?, ?)",
++                [(rows[barcode]["id"], -amount, reason, now) for barcode, amount in entries],
++            )
++            changes = [(rows[barcode], stock[barcode]) for barcode in totals]
++            added, removed = sync_shopping_list(cursor, changes, now)
++            return usage_id, cost_total, changes, added, removed
++
++        try:
++            usage_id, cost_total, changes, added, removed = self.location.writes.submit(apply)
++        except WriteRejected as exc:
++            return error_response(self, str(exc), exc.status)
++        events = [("usage.recorded", {"usage_id": usage_id, "client_name": payload["client_name"], "total_cost": round(cost_total, 2)})]
++        for row, new_stock in changes:
++            events += stock_events(row, new_stock, added=row["id"] in added, removed=row["id"] in removed)
++        self.location.item_cache.invalidate([row["id"] for row, _ in changes])
++        self.location.events.publish(events)
 +        json_response(self, {"message": "Usage recorded", "total_cost": round(cost_total, 2)})
 +
 +    def update_item(self, payload):
@@ -467,11 +3118,14 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +        missing = [field for field in required if field not in payload]
 +        if missing:
 +            return error_response(self, f"Missing fields: {', '.join(missing)}")
-+        conn = get_connection()
 +        try:
++            barcode = normalize_barcode(payload["barcode"])
++            require_text(payload, [field for field in ("name", "brand", "item_type", "unit_size") if field in payload])
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        with self.location.pool.writer() as conn:
 +            cursor = conn.cursor()
-+            cursor.execute("SELECT * FROM inventory_items WHERE barcode = ?", (payload["barcode"],))
-+            row = cursor.fetchone()
++            row = self.location.pool.barcodes.lookup(cursor, [barcode]).get(barcode)
 +            if row is None:
 +                return error_response(self, "Item not found", HTTPStatus.NOT_FOUND)
 +            updates = {}
@@ -506,122 +3160,886 @@ index 0000000000000000000000000000000000000000..976a0949751f8c8bd4b037feb511d115
 +                max_stock = updates.get("max_stock", row["max_stock"])
 +                if min_stock < 0 or max_stock <= 0 or max_stock < min_stock:
 +                    return error_response(self, "Invalid stock thresholds")
++            self.location.pool.barcodes.invalidate([row["barcode"]])
 +            set_clause = ", ".join(f"{key} = ?" for key in updates)
 +            values = list(updates.values())
 +            values.append(datetime.utcnow().isoformat())
 +            values.append(row["id"])
 +            cursor.execute(
-+                f"UPDATE inventory_items SET {set_clause}, updated_at = ? WHERE id = ?",
++                f"UPDATE inventory_items SET {set_clause}, updated_at = ? WHERE id = ? RETURNING *",
 +                values,
 +            )
-+            conn.commit()
-+        finally:
-+            conn.close()
++            self.location.pool.barcodes.stage(cursor.fetchone())
++        status = stock_status(
++            row["stock_level"],
++            updates.get("min_stock", row["min_stock"]),
++            updates.get("max_stock", row["max_stock"]),
++        )
++        self.location.item_cache.invalidate([row["id"]])
++        self.location.events.publish([("item.updated", {"barcode": row["barcode"], "fields": sorted(updates), "status": status})])
 +        json_response(self, {"message": "Item updated"})
 +
 +    def dashboard_summary(self):
-+        conn = get_connection()
++        summary, parts = location_dashboard(self.location)
++        json_bytes_response(self, splice_json(parts))
++
++    def dashboard_v2(self, parsed):
 +        try:
-+            cursor = conn.cursor()
-+            cursor.execute("SELECT * FROM inventory_items")
-+            items = [serialize_item(row) for row in cursor.fetchall()]
-+            total_value = sum(item["stock_value"] for item in items)
-+            total_units = sum(item["stock_level"] for item in items)
-+            low_stock = [item for item in items if item["status"] == "low"]
-+            overstock = [item for item in items if item["status"] == "overstock"]
-+            cursor.execute(
-+                """
-+                SELECT ur.id, ur.client_name, ur.usage_date, ur.total_cost, ur.created_at,
-+                       GROUP_CONCAT(ii.name || ' x' || ui.amount_used, '; ') AS details
-+                FROM usage_records ur
-+                JOIN usage_items ui ON ui.usage_id = ur.id
-+                JOIN inventory_items ii ON ui.item_id = ii.id
-+                GROUP BY ur.id
-+                ORDER BY ur.created_at DESC
-+                LIMIT 10
-+                """
-+            )
-+            recent_usage = [dict(row) for row in cursor.fetchall()]
-+            cursor.execute(
-+                """
-+                SELECT im.id, im.change_amount, im.reason, im.created_at, ii.name
-+                FROM inventory_movements im
-+                JOIN inventory_items ii ON im.item_id = ii.id
-+                ORDER BY im.created_at DESC
-+                LIMIT 10
-+                """
-+            )
-+            movements = [dict(row) for row in cursor.fetchall()]
-+            json_response(
-+                self,
-+                {
-+                    "total_value": round(total_value, 2),
-+                    "total_units": total_units,
-+                    "items": items,
-+                    "low_stock": low_stock,
-+                    "overstock": overstock,
-+                    "recent_usage": recent_usage,
-+                    "movements": movements,
-+                },
++            sections = parse_sections(parse_qs(parsed.query))
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        json_bytes_response(self, splice_json(dashboard_sections(self.location, sections)))
++
++    def group_dashboard(self):
++        deadline = time.monotonic() + GROUP_SHARD_TIMEOUT
++        futures = {
++            GROUP_EXECUTOR.submit(location_dashboard, location, deadline, False): name
++            for name, location in LOCATIONS.items()
++        }
++        wait(futures, timeout=GROUP_SHARD_TIMEOUT)
++        totals = dict.fromkeys(("total_value", "total_units", "item_count", "low_count", "overstock_count"), 0)
++        shards = []
++        for future, name in futures.items():
++            if not future.done():
++                future.cancel()
++                shards.append(splice_json([("name", encode_json(name)), ("status", b'"timeout"')]))
++                continue
++            try:
++                summary, parts = future.result()
++            except Exception as exc:
++                # One broken shard (missing or corrupt file, I/O error) must not fail the group.
++                status = "timeout" if isinstance(exc, sqlite3.OperationalError) and "interrupted" in str(exc) else "error"
++                if status == "error":
++                    print(f"Group dashboard: location {name} failed: {exc!r}", file=sys.stderr, flush=True)
++                shards.append(splice_json([("name", encode_json(name)), ("status", encode_json(status))]))
++                continue
++            for key in totals:
++                totals[key] += summary[key]
++            shards.append(
++                splice_json(
++                    [("name", encode_json(name)), ("status", b'"ok"')]
++                    + [(key, encode_json(summary[key])) for key in ("item_count", "low_count", "overstock_count")]
++                    + parts
++                )
 +            )
-+        finally:
-+            conn.close()
++        totals["total_value"] = round(totals["total_value"], 2)
++        json_bytes_response(
++            self, splice_json([(key, encode_json(value)) for key, value in totals.items()] + [("locations", join_fragments(shards))])
++        )
 +
-+    def get_shopping_list(self):
-+        conn = get_connection()
-+        try:
++    def get_shopping_list(self, parsed):
++        params = parse_qs(parsed.query)
++        mode = query_param(params, "mode", "list")
++        if mode == "predicted":
++            return self.get_predicted_shopping_list(params)
++        if mode != "list":
++            return error_response(self, "mode must be list or predicted")
++        with self.location.pool.reader() as conn:
 +            cursor = conn.cursor()
-+            cursor.execute(
-+                """
-+                SELECT sl.id, sl.added_at, ii.name, ii.barcode, ii.brand, ii.item_type
-+                FROM shopping_list sl
-+                JOIN inventory_items ii ON sl.item_id = ii.id
-+                ORDER BY sl.added_at DESC
-+                """
-+            )
++            cursor.execute(SHOPPING_LIST_QUERY)
 +            entries = [dict(row) for row in cursor.fetchall()]
 +            json_response(self, {"items": entries})
-+        finally:
-+            conn.close()
 +
-+    def get_activity(self):
-+        conn = get_connection()
++    def get_predicted_shopping_list(self, params):
 +        try:
++            lead_days = float(query_param(params, "lead_days", FORECAST_LEAD_DAYS))
++        except ValueError:
++            return error_response(self, "lead_days must be a number")
++        if not 0 <= lead_days <= 365:
++            return error_response(self, "lead_days must be between 0 and 365")
++        now = self.clock
++        with self.location.pool.reader() as conn:
 +            cursor = conn.cursor()
-+            cursor.execute(
-+                """
-+                SELECT im.id, im.change_amount, im.reason, im.created_at, ii.name
-+                FROM inventory_movements im
-+                JOIN inventory_items ii ON im.item_id = ii.id
-+                ORDER BY im.created_at DESC
-+                LIMIT 25
-+                """
++            cursor.execute(PREDICTED_SHOPPING_QUERY, {"now": now.isoformat(), "lead_days": lead_days})
++            rows = cursor.fetchall()
++        entries = []
++        for row in rows:
++            days_left = row["days_left"]
++            entries.append(
++                {
++                    "id": row["id"],
++                    "barcode": row["barcode"],
++                    "name": row["name"],
++                    "brand": row["brand"],
++                    "item_type": row["item_type"],
++                    "stock_level": row["stock_level"],
++                    "min_stock": row["min_stock"],
++                    "max_stock": row["max_stock"],
++                    "daily_usage": round(row["daily_usage"], 3),
++                    "days_until_stockout": None if days_left is None else round(days_left, 1),
++                    "stockout_date": None if days_left is None else (now + timedelta(days=days_left)).date().isoformat(),
++                    "reorder_quantity": max(row["max_stock"] - row["stock_level"], 0),
++                    "on_list": row["added_at"] is not None,
++                }
 +            )
-+            movements = [dict(row) for row in cursor.fetchall()]
-+            json_response(self, {"movements": movements})
++        json_response(self, {"mode": "predicted", "lead_days": lead_days, "items": entries})
++
++    def get_activity(self, parsed):
++        params = parse_qs(parsed.query)
++        try:
++            limit = parse_limit(params, ACTIVITY_PAGE_SIZE)
++            fields = parse_fields(params, ACTIVITY_FIELDS)
++            clauses, values = item_filters(params)
++            if query_param(params, "cursor"):
++                clauses.append("(im.created_at, im.id) < (?, ?)")
++                values.extend(decode_cursor(query_param(params, "cursor"), 2))
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        with self.location.pool.reader() as conn:
++            cursor = conn.cursor()
++            cursor.execute(MOVEMENTS_PAGE_QUERY.format(filters=" AND ".join(clauses) or "1"), (*values, limit + 1))
++            rows = cursor.fetchall()
++        next_cursor = None
++        if len(rows) > limit:
++            next_cursor = encode_cursor([rows[limit - 1]["created_at"], rows[limit - 1]["id"]])
++        movements = [project(dict(row), fields) for row in rows[:limit]]
++        json_response(self, {"movements": movements, "next_cursor": next_cursor})
++
++    def get_stock_at(self, parsed):
++        params = parse_qs(parsed.query)
++        try:
++            at = parse_timestamp(query_param(params, "at"))
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        barcode = query_param(params, "barcode")
++        with self.location.pool.reader() as conn:
++            cursor = conn.cursor()
++            item_id = None
++            if barcode:
++                cursor.execute("SELECT id FROM inventory_items WHERE barcode = ?", (barcode,))
++                row = cursor.fetchone()
++                if not row:
++                    return error_response(self, "Item not found", HTTPStatus.NOT_FOUND)
++                item_id = row["id"]
++            try:
++                items = stock_at(cursor, at, item_id)
++            except LookupError as exc:
++                return error_response(self, str(exc), HTTPStatus.GONE)
++        json_response(self, {"at": at, "items": items})
++
++    def search(self, parsed):
++        params = parse_qs(parsed.query)
++        scope = query_param(params, "type")
++        try:
++            expression = search_expression(query_param(params, "q"))
++            limit = parse_limit(params, SEARCH_PAGE_SIZE)
++            if scope not in (None, "usage", "items"):
++                raise ValueError("type must be usage or items")
++            offset = 0
++            if query_param(params, "cursor"):
++                if scope is None:
++                    raise ValueError("cursor requires type")
++                (offset,) = decode_cursor(query_param(params, "cursor"), 1)
++                if not isinstance(offset, int) or offset < 0:
++                    raise ValueError("Invalid cursor")
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        payload = {}
++        with self.location.pool.reader() as conn:
++            cursor = conn.cursor()
++            for name, sql, serialize in (
++                ("usage", SEARCH_USAGE_QUERY, dict),
++                ("items", SEARCH_ITEMS_QUERY, serialize_item),
++            ):
++                if scope not in (None, name):
++                    continue
++                cursor.execute(sql, {"match": expression, "limit": limit + 1, "offset": offset})
++                rows = cursor.fetchall()
++                next_cursor = encode_cursor([offset + limit]) if len(rows) > limit else None
++                payload[name] = {"results": [serialize(row) for row in rows[:limit]], "next_cursor": next_cursor}
++        json_response(self, payload)
++
++    def export(self, parsed):
++        kind = parsed.path.removeprefix("/api/export/")
++        if kind not in EXPORTS:
++            return error_response(self, "Unknown export", HTTPStatus.NOT_FOUND)
++        params = parse_qs(parsed.query)
++        output = query_param(params, "format", "csv")
++        try:
++            if output not in ("csv", "ndjson"):
++                raise ValueError("format must be csv or ndjson")
++            start = query_param(params, "from")
++            end = query_param(params, "to")
++            bounds = {
++                "start": parse_timestamp(start, "from") if start else "",
++                "end": parse_timestamp(end, "to") if end else "9999",
++            }
++        except ValueError as exc:
++            return error_response(self, str(exc))
++        if not EXPORT_SLOTS.acquire(blocking=False):
++            return error_response(self, "Too many exports in progress, please retry", HTTPStatus.SERVICE_UNAVAILABLE)
++        try:
++            self.stream_export(kind, output, bounds)
 +        finally:
-+            conn.close()
++            EXPORT_SLOTS.release()
++
++    def stream_export(self, kind, output, bounds):
++        columns, queries = EXPORTS[kind]
++        chunked = self.request_version == "HTTP/1.1"
++        self.send_response(HTTPStatus.OK)
++        self.send_header("Content-Type", "text/csv; charset=utf-8" if output == "csv" else "application/x-ndjson")
++        self.send_header("Content-Disposition", f'attachment; filename="{kind}-{datetime.utcnow():%Y%m%d}.{output}"')
++        self.send_header("Cache-Control", "no-store")
++        self.send_header("Connection", "close")
++        if chunked:
++            self.send_header("Transfer-Encoding", "chunked")
++        self.end_headers()
++        self.close_connection = True
++        self.connection.settimeout(EXPORT_SEND_TIMEOUT)
++        buffer = io.StringIO()
++        writer = csv.writer(buffer)
++        if output == "csv":
++            writer.writerow(columns)
++        with self.location.pool.reader() as conn:
++            cursor = conn.cursor()
++            try:
++                for sql in queries:
++                    cursor.execute(sql, bounds)
++                    rows = cursor.fetchmany(SQL_CHUNK_SIZE)
++                    while rows:
++                        for row in rows:
++                            record = serialize_item(row) if kind == "inventory" else row
++                            if output == "csv":
++                                writer.writerow(
++                                    [json.dumps(record[column]) if column == "attributes" else record[column] for column in columns]
++                                )
++                            else:
++                                buffer.write(json.dumps({column: record[column] for column in columns}))
++                                buffer.write("\n")
++                        if buffer.tell() >= EXPORT_CHUNK_BYTES:
++                            self.write_chunk(buffer, chunked)
++                        rows = cursor.fetchmany(SQL_CHUNK_SIZE)
++                self.write_chunk(buffer, chunked)
++                if chunked:
++                    self.wfile.write(b"0\r\n\r\n")
++            except OSError:
++                pass
++            finally:
++                cursor.close()
++
++    def write_chunk(self, buffer, chunked):
++        data = buffer.getvalue().encode("utf-8")
++        buffer.seek(0)
++        buffer.truncate()
++        if not data:
++            return
++        self.response_bytes += len(data)
++        if chunked:
++            data = f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n"
++        self.wfile.write(data)
++
++    def get_metrics(self):
++        # Under the prefork supervisor each worker keeps its own counters, so the scrape
++        # is answered with the sum over all workers, collected through the event relay.
++        body = None
++        if self.server.relay is not None:
++            body = self.server.relay.collect_metrics()
++        if body is None:
++            body = self.server.render_metrics()
++        self.send_response(HTTPStatus.OK)
++        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
++        self.send_header("Content-Length", str(len(body)))
++        self.send_header("Cache-Control", "no-store")
++        self.end_headers()
++        self.wfile.write(body)
 +
 +    def log_message(self, format, *args):
 +        return
 +
 +
++class IdleConnections:
++    """Keep-alive connections waiting for their next request, held without a worker thread."""
++
++    def __init__(self, server, timeout=KEEPALIVE_TIMEOUT):
++        self.server = server
++        self.timeout = timeout
++        self.lock = threading.Lock()
++        self.incoming = []
++        self.selector = selectors.DefaultSelector()
++        self.wake_reader, self.wake_writer = socket.socketpair()
++        self.wake_writer.setblocking(False)
++        self.selector.register(self.wake_reader, selectors.EVENT_READ)
++        self.running = True
++        self.thread = threading.Thread(target=self.run, name="http-idle", daemon=True)
++        self.thread.start()
++
++    def park(self, handler):
++        with self.lock:
++            if self.running:
++                self.incoming.append(handler)
++                handler = None
++        if handler is not None:
++            return self.server.release(handler)
++        self.wake()
++
++    def wake(self):
++        try:
++            self.wake_writer.send(b"\0")
++        except (BlockingIOError, OSError):
++            pass
++
++    def run(self):
++        deadlines = {}
++        while self.running:
++            timeout = max(min(deadlines.values()) - time.monotonic(), 0) if deadlines else None
++            for key, _ in self.selector.select(timeout=timeout):
++                if key.fileobj is self.wake_reader:
++                    self.wake_reader.recv(4096)
++                    continue
++                self.selector.unregister(key.fileobj)
++                del deadlines[key.data]
++                self.server.resume(key.data)
++            with self.lock:
++                incoming, self.incoming = self.incoming, []
++            for handler in incoming:
++                self.selector.register(handler.connection, selectors.EVENT_READ, handler)
++                deadlines[handler] = time.monotonic() + self.timeout
++            now = time.monotonic()
++            for handler in [handler for handler, deadline in deadlines.items() if deadline <= now]:
++                self.selector.unregister(handler.connection)
++                del deadlines[handler]
++                self.server.release(handler)
++        for handler in deadlines:
++            self.server.release(handler)
++
++    def close(self):
++        with self.lock:
++            self.running = False
++            incoming, self.incoming = self.incoming, []
++        self.wake()
++        self.thread.join(2)
++        for handler in incoming:
++            self.server.release(handler)
++
++
++class PooledHTTPServer(HTTPServer):
++    request_queue_size = SERVER_BACKLOG
++    relay = None
++
++    def __init__(self, address, handler_class, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE, bind_and_activate=True):
++        super().__init__(address, handler_class, bind_and_activate)
++        self.pending = queue.Queue(maxsize=queue_size)
++        self.idle = IdleConnections(self)
++        self.workers = []
++        for index in range(max(workers, 1)):
++            worker = threading.Thread(target=self.worker_loop, name=f"http-worker-{index}", daemon=True)
++            worker.start()
++            self.workers.append(worker)
++
++    def process_request(self, request, client_address):
++        try:
++            self.pending.put_nowait((request, client_address))
++        except queue.Full:
++            self.reject_request(request)
++
++    def worker_loop(self):
++        while True:
++            job = self.pending.get()
++            if job is None:
++                return
++            if isinstance(job, tuple):
++                request, client_address = job
++                handler = None
++                try:
++                    handler = self.finish_request(request, client_address)
++                except Exception:
++                    self.handle_error(request, client_address)
++            else:
++                handler, request = job, job.request
++                try:
++                    handler.resume()
++                except ConnectionError:
++                    handler.parked = False
++                except Exception:
++                    handler.parked = False
++                    self.handle_error(request, handler.client_address)
++            if getattr(handler, "parked", False):
++                self.idle.park(handler)
++            elif not getattr(handler, "detached", False):
++                self.shutdown_request(request)
++
++    def finish_request(self, request, client_address):
++        return self.RequestHandlerClass(request, client_address, self)
++
++    def resume(self, handler):
++        try:
++            self.pending.put_nowait(handler)
++        except queue.Full:
++            self.reject_request(handler.request)
++            handler.parked = False
++            handler.finish()
++
++    def release(self, handler):
++        handler.parked = False
++        try:
++            handler.finish()
++        except OSError:
++            pass
++        self.shutdown_request(handler.request)
++
++    def render_metrics(self):
++        samples = {name: [] for name, _, _ in LOCATION_METRICS}
++        batch_sizes = []
++        for name, location in LOCATIONS.items():
++            labels = f'location="{name}"'
++            for metric, value in location.metric_values().items():
++                samples[metric].append((labels, value))
++            batch_sizes.append((labels, location.writes.batch_sizes))
++        queue_depth = self.pending.qsize()
++        gauges = [("inventory_http_queue_depth", "gauge", "Accepted connections waiting for a worker", queue_depth)]
++        gauges += [(name, kind, description, samples[name]) for name, kind, description in LOCATION_METRICS]
++        histograms = [("inventory_write_batch_size", "Operations per coordinated transaction", batch_sizes)]
++        return METRICS.render(gauges, histograms)
++
++    def reject_request(self, request):
++        METRICS.record_rejected()
++        body = json.dumps({"error": "Server is busy, please retry"}).encode("utf-8")
++        head = (
++            "HTTP/1.0 503 Service Unavailable\r\n"
++            "Content-Type: application/json\r\n"
++            f"Content-Length: {len(body)}\r\n"
++            "Retry-After: 1\r\n"
++            "Connection: close\r\n\r\n"
++        )
++        # A fresh socket's send buffer always holds this short reply; never wait
++        # on the client from the accept thread.
++        try:
++            request.setblocking(False)
++            request.send(head.encode("latin-1") + body)
++        except OSError:
++            pass
++        finally:
++            self.shutdown_request(request)
++
++    def drain(self, timeout=SHUTDOWN_TIMEOUT):
++        deadline = time.monotonic() + timeout
++        self.idle.close()
++        for _ in self.workers:
++            try:
++                self.pending.put(None, timeout=max(deadline - time.monotonic(), 0.01))
++            except queue.Full:
++                break
++        for worker in self.workers:
++            worker.join(max(deadline - time.monotonic(), 0))
++        return all(not worker.is_alive() for worker in self.workers)
++
++
++class EventRelay:
++    def __init__(self, sock, on_close):
++        self.sock = sock
++        self.on_close = on_close
++        self.ready = threading.Condition()
++        self.pending = bytearray()
++        self.dropped = 0
++        self.render_metrics = None
++        self.collections = {}
++        self.next_token = 0
++        self.thread = threading.Thread(target=self.run, name="event-relay", daemon=True)
++        self.writer = threading.Thread(target=self.write, name="event-relay-writer", daemon=True)
++
++    def attach(self, locations):
++        for name, location in locations.items():
++            location.events.relay = lambda events, name=name: self.send(name, events)
++        self.thread.start()
++        self.writer.start()
++
++    def send(self, name, events):
++        # Called from request threads: queue the message and return, never wait on the supervisor.
++        if not self.queue_message({"location": name, "events": events}):
++            if not self.dropped:
++                print("Event relay buffer is full, dropping events", file=sys.stderr, flush=True)
++            self.dropped += len(events)
++        else:
++            self.dropped = 0
++
++    def queue_message(self, message):
++        message = json.dumps(message).encode("utf-8") + b"\n"
++        with self.ready:
++            if len(self.pending) + len(message) > EVENT_RELAY_BUFFER_BYTES:
++                return False
++            self.pending += message
++            self.ready.notify()
++        return True
++
++    def collect_metrics(self, timeout=METRICS_COLLECT_TIMEOUT * 2):
++        with self.ready:
++            self.next_token += 1
++            token = self.next_token
++            self.collections[token] = [threading.Event(), None]
++        try:
++            if self.queue_message({"collect": token}):
++                self.collections[token][0].wait(timeout)
++            return self.collections[token][1]
++        finally:
++            with self.ready:
++                del self.collections[token]
++
++    def write(self):
++        while True:
++            with self.ready:
++                while not self.pending:
++                    self.ready.wait()
++                message = bytes(self.pending)
++                del self.pending[:]
++            try:
++                self.sock.sendall(message)
++            except OSError:
++                return
++
++    def run(self):
++        with self.sock.makefile("rb") as reader:
++            for line in reader:
++                message = json.loads(line)
++                if "snapshot" in message:
++                    body = self.render_metrics().decode("utf-8") if self.render_metrics else ""
++                    self.queue_message({"report": message["snapshot"], "body": body})
++                elif "collected" in message:
++                    with self.ready:
++                        collection = self.collections.get(message["collected"])
++                        if collection is not None:
++                            collection[1] = message["body"].encode("utf-8")
++                            collection[0].set()
++                else:
++                    location = LOCATIONS.get(message["location"])
++                    if location is not None:
++                        location.events.deliver(message["events"], message["id"])
++        self.on_close()
++
++
++class Supervisor:
++    def __init__(self, address, processes=PROCESSES):
++        self.processes = max(processes, 1)
++        self.listener = socket.create_server(address, backlog=SERVER_BACKLOG)
++        self.listener.set_inheritable(True)
++        self.selector = selectors.DefaultSelector()
++        self.workers = {}
++        self.retiring = {}
++        self.channels = {}
++        self.buffers = {}
++        self.outgoing = {}
++        self.collections = {}
++        self.next_collection = 0
++        self.next_ids = {}
++        self.restart_at = 0.0
++        self.stopping = False
++        self.reloading = False
++
++    def spawn(self):
++        channel, child = socket.socketpair()
++        channel.setblocking(False)
++        env = dict(os.environ, INVENTORY_LISTEN_FD=str(self.listener.fileno()), INVENTORY_RELAY_FD=str(child.fileno()))
++        process = subprocess.Popen(
++            [sys.executable, str(Path(__file__).resolve())],
++            env=env,
++            pass_fds=(self.listener.fileno(), child.fileno()),
++        )
++        child.close()
++        self.workers[process] = time.monotonic()
++        self.channels[process] = channel
++        self.buffers[channel] = bytearray()
++        self.outgoing[channel] = bytearray()
++        self.selector.register(channel, selectors.EVENT_READ, process)
++
++    def relay(self, channel):
++        try:
++            data = channel.recv(65536)
++        except BlockingIOError:
++            return
++        except OSError:
++            data = b""
++        if not data:
++            self.selector.unregister(channel)
++            return
++        buffer = self.buffers[channel]
++        buffer += data
++        while b"\n" in buffer:
++            line, _, rest = bytes(buffer).partition(b"\n")
++            buffer[:] = rest
++            message = json.loads(line)
++            if "collect" in message:
++                self.collect(channel, message["collect"])
++                continue
++            if "report" in message:
++                self.report(channel, message["report"], message["body"])
++                continue
++            first_id = self.next_ids.get(message["location"], int(time.time() * 1000))
++            self.next_ids[message["location"]] = first_id + len(message["events"])
++            message["id"] = first_id
++            payload = json.dumps(message).encode("utf-8") + b"\n"
++            for process in list(self.channels):
++                self.send(process, payload)
++
++    def send(self, process, payload):
++        target = self.channels.get(process)
++        outgoing = self.outgoing.get(target)
++        if outgoing is None:
++            return
++        outgoing += payload
++        if len(outgoing) > EVENT_RELAY_BUFFER_BYTES:
++            print(f"Worker {process.pid} is not reading relayed messages, restarting", file=sys.stderr, flush=True)
++            self.retire(process)
++        else:
++            self.flush(target)
++
++    def collect(self, requester, token):
++        # A scrape on any worker reports the sum over all live workers, so every
++        # worker answers /api/metrics with the same process-wide counters.
++        self.next_collection += 1
++        waiting = {self.channels[process] for process in self.workers}
++        self.collections[self.next_collection] = {
++            "requester": requester,
++            "token": token,
++            "waiting": waiting,
++            "bodies": [],
++            "deadline": time.monotonic() + METRICS_COLLECT_TIMEOUT,
++        }
++        payload = json.dumps({"snapshot": self.next_collection}).encode("utf-8") + b"\n"
++        for process in list(self.workers):
++            self.send(process, payload)
++
++    def report(self, channel, collection_id, body):
++        collection = self.collections.get(collection_id)
++        if collection is None or channel not in collection["waiting"]:
++            return
++        collection["waiting"].discard(channel)
++        collection["bodies"].append(body)
++        self.finish_collections()
++
++    def finish_collections(self):
++        now = time.monotonic()
++        live = set(self.channels.values())
++        for collection_id, collection in list(self.collections.items()):
++            collection["waiting"] &= live
++            if collection["waiting"] and now < collection["deadline"]:
++                continue
++            del self.collections[collection_id]
++            body = merge_metrics(collection["bodies"])
++            payload = json.dumps({"collected": collection["token"], "body": body}).encode("utf-8") + b"\n"
++            for process, channel in list(self.channels.items()):
++                if channel is collection["requester"]:
++                    self.send(process, payload)
++
++    def flush(self, channel):
++        outgoing = self.outgoing.get(channel)
++        if outgoing is None:
++            return
++        try:
++            sent = channel.send(outgoing) if outgoing else 0
++        except BlockingIOError:
++            sent = 0
++        except OSError:
++            sent = len(outgoing)
++        del outgoing[:sent]
++        if channel in self.selector.get_map():
++            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if outgoing else 0)
++            if self.selector.get_key(channel).events != events:
++                self.selector.modify(channel, events, self.selector.get_key(channel).data)
++
++    def retire(self, process):
++        channel = self.channels[process]
++        self.outgoing.pop(channel, None)
++        if channel in self.selector.get_map():
++            self.selector.modify(channel, selectors.EVENT_READ, process)
++        if self.workers.pop(process, None) is not None:
++            process.terminate()
++            self.retiring[process] = time.monotonic() + SHUTDOWN_TIMEOUT + 1
++
++    def release(self, process):
++        channel = self.channels.pop(process)
++        if channel in self.selector.get_map():
++            self.selector.unregister(channel)
++        del self.buffers[channel]
++        self.outgoing.pop(channel, None)
++        channel.close()
++
++    def reap(self):
++        for process in list(self.workers):
++            code = process.poll()
++            if code is None:
++                continue
++            del self.workers[process]
++            self.release(process)
++            if not self.stopping:
++                print(f"Worker {process.pid} exited with status {code}, restarting", file=sys.stderr, flush=True)
++        for process, deadline in list(self.retiring.items()):
++            if process.poll() is None and time.monotonic() > deadline:
++                process.kill()
++            if process.poll() is not None:
++                del self.retiring[process]
++                self.release(process)
++        if not self.stopping and len(self.workers) < self.processes and time.monotonic() >= self.restart_at:
++            self.restart_at = time.monotonic() + WORKER_RESTART_DELAY
++            while len(self.workers) < self.processes:
++                self.spawn()
++
++    def reload(self):
++        self.reloading = False
++        # Workers never migrate, so the code being loaded applies its own migrations first.
++        migration = subprocess.run([sys.executable, str(Path(__file__).resolve()), "migrate"])
++        if migration.returncode != 0:
++            print("Migration failed, keeping the running workers", file=sys.stderr, flush=True)
++            return
++        previous = list(self.workers)
++        for _ in range(self.processes):
++            self.spawn()
++        for process in previous:
++            self.retire(process)
++        print(f"Reloaded {self.processes} worker processes", flush=True)
++
++    def stop(self):
++        for process in list(self.workers) + list(self.retiring):
++            process.terminate()
++        deadline = time.monotonic() + SHUTDOWN_TIMEOUT + 1
++        for process in list(self.workers) + list(self.retiring):
++            try:
++                process.wait(max(deadline - time.monotonic(), 0.01))
++            except subprocess.TimeoutExpired:
++                print(f"Worker {process.pid} did not stop in time", file=sys.stderr, flush=True)
++                process.kill()
++                process.wait()
++        for process in list(self.channels):
++            self.release(process)
++        self.listener.close()
++
++    def run(self):
++        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, "stopping", True))
++        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, "stopping", True))
++        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, "reloading", True))
++        self.reap()
++        while not self.stopping:
++            for key, mask in self.selector.select(timeout=0.5):
++                if mask & selectors.EVENT_WRITE:
++                    self.flush(key.fileobj)
++                if mask & selectors.EVENT_READ:
++                    self.relay(key.fileobj)
++            if self.reloading:
++                self.reload()
++            self.reap()
++            self.finish_collections()
++        self.stop()
++
++
 +def run_server():
-+    initialize_database()
 +    port = int(os.environ.get("PORT", "8000"))
 +    address = ("0.0.0.0", port)
-+    httpd = HTTPServer(address, InventoryRequestHandler)
-+    print(f"Inventory management server running on http://{address[0]}:{address[1]}")
++    listen_fd = os.environ.get("INVENTORY_LISTEN_FD")
++    if listen_fd is None and PROCESSES > 1 and os.name == "posix":
++        initialize_database()
++        supervisor = Supervisor(address)
++        print(f"Inventory management server running on http://{address[0]}:{address[1]} with {supervisor.processes} processes")
++        return supervisor.run()
++    if listen_fd is None:
++        initialize_database()
++        httpd = PooledHTTPServer(address, InventoryRequestHandler)
++        print(f"Inventory management server running on http://{address[0]}:{address[1]}")
++    else:
++        httpd = PooledHTTPServer(address, InventoryRequestHandler, bind_and_activate=False)
++        httpd.socket.close()
++        httpd.socket = socket.socket(fileno=int(listen_fd))
++        httpd.socket.setblocking(False)
++        relay = EventRelay(
++            socket.socket(fileno=int(os.environ["INVENTORY_RELAY_FD"])),
++            lambda: threading.Thread(target=httpd.shutdown).start(),
++        )
++        relay.render_metrics = httpd.render_metrics
++        relay.attach(LOCATIONS)
++        httpd.relay = relay
++    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
 +    try:
 +        httpd.serve_forever()
 +    except KeyboardInterrupt:
 +        pass
 +    finally:
++        httpd.socket.close()
++        if not httpd.drain():
++            print("Shutdown timed out with requests still in flight")
 +        httpd.server_close()
++        GROUP_EXECUTOR.shutdown(wait=False, cancel_futures=True)
++        for location in LOCATIONS.values():
++            location.close()
++
++
++def main(argv=None):
++    parser = argparse.ArgumentParser(description="Inventory management server")
++    commands = parser.add_subparsers(dest="command")
++    commands.add_parser("serve", help="run the HTTP server (default)")
++    commands.add_parser("migrate", help="apply pending schema migrations")
++    commands.add_parser("check-plans", help="verify hot queries are served by indexes")
++    commands.add_parser("verify-ledger", help="check stock levels against the movement ledger")
++    verify = commands.add_parser("verify-summary", help="recompute dashboard aggregates and report drift")
++    verify.add_argument("--rebuild", action="store_true", help="overwrite the stored aggregates")
++    compact = commands.add_parser("compact", help="roll old movements into per-item stock snapshots")
++    compact.add_argument(
++        "--retention-days",
++        type=int,
++        default=LEDGER_RETENTION_DAYS,
++        help="keep movement detail newer than this many days",
++    )
++    compact.add_argument("--prune", action="store_true", help="delete old movements instead of archiving them")
++    parser.add_argument("--location", choices=sorted(LOCATIONS), help="limit maintenance commands to one location")
++    args = parser.parse_args(argv)
++    if DEFAULT_LOCATION not in LOCATIONS:
++        parser.error(f"DEFAULT_LOCATION {DEFAULT_LOCATION!r} is not a configured location ({', '.join(sorted(LOCATIONS))})")
++    if args.command in (None, "serve"):
++        return run_server()
++    selected = {args.location: LOCATIONS[args.location]} if args.location else LOCATIONS
++    initialize_database(selected.values())
++    failed = False
++    for name, location in selected.items():
++        def report(message):
++            print(f"{name}: {message}" if len(selected) > 1 else message)
++
++        if args.command == "check-plans":
++            conn = get_connection(location.path, read_only=True)
++            try:
++                problems = check_query_plans(conn)
++            finally:
++                conn.close()
++            for problem in problems:
++                report(problem)
++            if problems:
++                failed = True
++            else:
++                report("All hot queries use their indexes")
++        elif args.command == "verify-ledger":
++            with location.pool.reader() as conn:
++                mismatches = verify_ledger(conn.cursor())
++            for mismatch in mismatches:
++                report(json.dumps(mismatch))
++            if mismatches:
++                failed = True
++            else:
++                report("Stock levels match the movement ledger")
++        elif args.command == "verify-summary":
++            with location.pool.writer() as conn:
++                cursor = conn.cursor()
++                drift = summary_drift(cursor)
++                if args.rebuild:
++                    rebuild_inventory_summary(cursor)
++            for key, values in drift.items():
++                report(f"{key}: {json.dumps(values)}")
++            if not drift:
++                report("Dashboard aggregates match the inventory")
++            elif args.rebuild:
++                report("Dashboard aggregates rebuilt")
++            else:
++                failed = True
++        elif args.command == "compact":
++            cutoff = (datetime.utcnow() - timedelta(days=args.retention_days)).isoformat()
++            movements, snapshots = compact_ledger(location.pool, cutoff, prune=args.prune)
++            action = "Pruned" if args.prune else "Archived"
++            report(f"{action} {movements} movements before {cutoff} into {snapshots} snapshots")
++            with location.pool.reader() as conn:
++                mismatches = verify_ledger(conn.cursor())
++            if mismatches:
++                report(f"{len(mismatches)} items no longer match the ledger")
++                failed = True
++    if failed:
++        raise SystemExit(1)
 +
 +
 +if __name__ == "__main__":
-+    run_server()
++    main()
  
 EOF
 )
@@ -0,0 +1,350 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/benchmarks/load_test.py
+index 0000000000000000000000000000000000000000..dbd87e8643a31352984c882e12947edff19476f6 100644
+--- a//dev/null
++++ b/benchmarks/load_test.py
+@@ -0,0 +1,341 @@
++import argparse
++import http.client
++import json
++import os
++import random
++import socket
++import subprocess
++import sys
++import tempfile
++import threading
++import time
++from datetime import datetime, timedelta
++from pathlib import Path
++
++ROOT = Path(__file__).resolve().parent.parent
++sys.path.insert(0, str(ROOT))
++
++import app
++
++DEFAULT_MIX = "dashboard=15,items=25,adjust=35,usage=25"
++BRANDS = ("Wella", "Redken", "Goldwell", "Schwarzkopf", "Matrix", "Pravana")
++TYPES = ("color", "developer", "toner", "lightener", "treatment")
++
++
++def timestamps(rng, count, days):
++    start = datetime.utcnow() - timedelta(days=days)
++    span = days * 86400
++    offsets = sorted(rng.random() * span for _ in range(count))
++    return [(start + timedelta(seconds=offset)).isoformat() for offset in offsets]
++
++
++def seed_database(path, items, movements, usage, days, seed):
++    rng = random.Random(seed)
++    conn = app.get_connection(path)
++    try:
++        conn.execute("PRAGMA journal_mode = WAL")
++        app.migrate(conn)
++        conn.execute("PRAGMA synchronous = OFF")
++        conn.execute("BEGIN IMMEDIATE")
++        movement_items = [rng.randrange(items) for _ in range(movements)]
++        consumed = [0] * items
++        amounts = []
++        for index in movement_items:
++            amount = rng.randint(1, 3)
++            consumed[index] += amount
++            amounts.append(amount)
++        item_times = timestamps(rng, items, days)
++        opening = [consumed[index] + rng.randint(0, 40) for index in range(items)]
++        conn.executemany(
++            """
++            INSERT INTO inventory_items (
++                id, barcode, name, brand, item_type, attributes, unit_size,
++                unit_cost, stock_level, min_stock, max_stock, created_at, updated_at
++            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
++            """,
++            (
++                (
++                    index + 1,
++                    f"LOAD{index:07d}",
++                    f"{BRANDS[index % len(BRANDS)]} {index % 12 + 1}.{index % 7} #{index}",
++                    BRANDS[index % len(BRANDS)],
++                    TYPES[index % len(TYPES)],
++                    json.dumps({"level": index % 12 + 1, "tone": index % 7}),
++                    "60ml",
++                    round(rng.uniform(3, 25), 2),
++                    opening[index] - consumed[index],
++                    5,
++                    40,
++                    item_times[index],
++                    item_times[index],
++                )
++                for index in range(items)
++            ),
++        )
++        conn.executemany(
++            "INSERT INTO inventory_movements (item_id, change_amount, reason, created_at) VALUES (?, ?, 'Initial stock', ?)",
++            ((index + 1, opening[index], item_times[index]) for index in range(items)),
++        )
++        movement_times = timestamps(rng, movements, days)
++        conn.executemany(
++            "INSERT INTO inventory_movements (item_id, change_amount, reason, created_at) VALUES (?, ?, 'Usage: seeded', ?)",
++            (
++                (movement_items[position] + 1, -amounts[position], movement_times[position])
++                for position in range(movements)
++            ),
++        )
++        usage_times = timestamps(rng, usage, days)
++        conn.executemany(
++            """
++            INSERT INTO usage_records (id, client_name, usage_date, before_state, after_state, total_cost, created_at)
++            VALUES (?, ?, ?, 'Level 6 natural', 'Level 8 ash', ?, ?)
++            """,
++            (
++                (position + 1, f"Client {rng.randrange(usage // 4 + 1)}", usage_times[position][:10], 12.5, usage_times[position])
++                for position in range(usage)
++            ),
++        )
++        conn.executemany(
++            "INSERT INTO usage_items (usage_id, item_id, amount_used, cost) VALUES (?, ?, ?, ?)",
++            (
++                (position + 1, rng.randrange(items) + 1, rng.randint(1, 3), 6.25)
++                for position in range(usage)
++                for _ in range(rng.randint(1, 3))
++            ),
++        )
++        conn.execute("INSERT INTO shopping_list (item_id, added_at) SELECT id, updated_at FROM inventory_items WHERE stock_level = 0")
++        app.rebuild_inventory_summary(conn.cursor())
++        conn.commit()
++        conn.execute("PRAGMA synchronous = NORMAL")
++        conn.execute("ANALYZE")
++    finally:
++        conn.close()
++
++
++def free_port():
++    with socket.socket() as sock:
++        sock.bind(("127.0.0.1", 0))
++        return sock.getsockname()[1]
++
++
++def start_server(db_path, port, env_overrides):
++    env = dict(os.environ, INVENTORY_DB=str(db_path), PORT=str(port), **env_overrides)
++    process = subprocess.Popen(
++        [sys.executable, str(ROOT / "app.py"), "serve"],
++        env=env,
++        stdout=subprocess.DEVNULL,
++        stderr=subprocess.DEVNULL,
++    )
++    deadline = time.monotonic() + 30
++    while time.monotonic() < deadline:
++        try:
++            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
++                return process
++        except OSError:
++            if process.poll() is not None:
++                raise SystemExit("server exited during startup")
++            time.sleep(0.1)
++    process.terminate()
++    raise SystemExit("server did not start within 30 seconds")
++
++
++def parse_mix(text):
++    mix = {}
++    for part in text.split(","):
++        name, _, weight = part.partition("=")
++        mix[name.strip()] = float(weight)
++    unknown = set(mix) - {"dashboard", "items", "adjust", "usage"}
++    if unknown:
++        raise SystemExit(f"unknown endpoints in mix: {', '.join(sorted(unknown))}")
++    return mix
++
++
++def build_request(name, rng, items):
++    barcode = f"LOAD{rng.randrange(items):07d}"
++    if name == "dashboard":
++        return "GET", "/api/dashboard", None
++    if name == "items":
++        return "GET", f"/api/items?limit=100&brand={BRANDS[rng.randrange(len(BRANDS))]}", None
++    if name == "adjust":
++        return "POST", "/api/items/adjust", {"barcode": barcode, "delta": rng.choice((-1, -1, -2, 1, 3)), "reason": "Load test"}
++    lines = [{"barcode": f"LOAD{rng.randrange(items):07d}", "amount": rng.randint(1, 2)} for _ in range(rng.randint(1, 3))]
++    return (
++        "POST",
++        "/api/usage",
++        {
++            "client_name": f"Load client {rng.randrange(1000)}",
++            "usage_date": datetime.utcnow().date().isoformat(),
++            "before_state": "Level 6",
++            "after_state": "Level 8",
++            "items": lines,
++        },
++    )
++
++
++def client_loop(port, mix, items, deadline, seed, samples, lock):
++    rng = random.Random(seed)
++    names = list(mix)
++    weights = [mix[name] for name in names]
++    conn = None
++    local = []
++    while time.monotonic() < deadline:
++        name = rng.choices(names, weights)[0]
++        method, path, payload = build_request(name, rng, items)
++        body = json.dumps(payload).encode("utf-8") if payload is not None else None
++        headers = {"Accept-Encoding": "gzip"}
++        if body is not None:
++            headers["Content-Type"] = "application/json"
++        start = time.perf_counter()
++        try:
++            if conn is None:
++                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
++            conn.request(method, path, body=body, headers=headers)
++            response = conn.getresponse()
++            response.read()
++            status = response.status
++            if response.will_close:
++                conn.close()
++                conn = None
++        except (OSError, http.client.HTTPException):
++            status = 0
++            if conn is not None:
++                conn.close()
++            conn = None
++        local.append((name, status, time.perf_counter() - start))
++    if conn is not None:
++        conn.close()
++    with lock:
++        samples.extend(local)
++
++
++def percentile(values, fraction):
++    if not values:
++        return 0.0
++    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
++    return values[index]
++
++
++def summarize(samples, duration):
++    results = {}
++    for name in sorted({sample[0] for sample in samples}):
++        latencies = sorted(sample[2] for sample in samples if sample[0] == name)
++        statuses = {}
++        for sample in samples:
++            if sample[0] == name:
++                statuses[str(sample[1])] = statuses.get(str(sample[1]), 0) + 1
++        results[name] = {
++            "requests": len(latencies),
++            "throughput_rps": round(len(latencies) / duration, 2),
++            "statuses": statuses,
++            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
++            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
++            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
++            "max_ms": round(latencies[-1] * 1000, 2),
++        }
++    return results
++
++
++def compare(current, baseline, max_regression):
++    regressions = []
++    for name, stats in current["endpoints"].items():
++        previous = baseline.get("endpoints", {}).get(name)
++        if not previous:
++            continue
++        for metric in ("p50_ms", "p95_ms", "p99_ms"):
++            if previous[metric] and stats[metric] > previous[metric] * (1 + max_regression):
++                regressions.append(f"{name} {metric}: {previous[metric]} -> {stats[metric]}")
++        if stats["throughput_rps"] < previous["throughput_rps"] * (1 - max_regression):
++            regressions.append(f"{name} throughput_rps: {previous['throughput_rps']} -> {stats['throughput_rps']}")
++    return regressions
++
++
++def main(argv=None):
++    parser = argparse.ArgumentParser(description="Seed a synthetic inventory and load test the server")
++    parser.add_argument("--items", type=int, default=10_000)
++    parser.add_argument("--movements", type=int, default=1_000_000)
++    parser.add_argument("--usage", type=int, default=200_000)
++    parser.add_argument("--days", type=int, default=730, help="history span for seeded timestamps")
++    parser.add_argument("--clients", type=int, default=32)
++    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured traffic")
++    parser.add_argument("--warmup", type=float, default=3.0)
++    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. dashboard=15,items=25")
++    parser.add_argument("--seed", type=int, default=1)
++    parser.add_argument("--db", type=Path, help="reuse or create the database at this path")
++    parser.add_argument("--reseed", action="store_true", help="recreate --db even if it exists")
++    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE")
++    parser.add_argument("--output", type=Path, help="write JSON results to this file")
++    parser.add_argument("--compare", type=Path, help="baseline JSON results to compare against")
++    parser.add_argument("--max-regression", type=float, default=0.2)
++    args = parser.parse_args(argv)
++    mix = parse_mix(args.mix)
++    server_env = dict(entry.split("=", 1) for entry in args.server_env)
++
++    with tempfile.TemporaryDirectory() as directory:
++        db_path = args.db or Path(directory) / "load.db"
++        if args.reseed or not db_path.exists():
++            for suffix in ("", "-wal", "-shm"):
++                Path(f"{db_path}{suffix}").unlink(missing_ok=True)
++            start = time.perf_counter()
++            seed_database(db_path, args.items, args.movements, args.usage, args.days, args.seed)
++            print(f"seeded {db_path} in {time.perf_counter() - start:.1f}s")
++        port = free_port()
++        server = start_server(db_path, port, server_env)
++        try:
++            lock = threading.Lock()
++            for phase, duration in (("warmup", args.warmup), ("measure", args.duration)):
++                samples = []
++                deadline = time.monotonic() + duration
++                threads = [
++                    threading.Thread(
++                        target=client_loop,
++                        args=(port, mix, args.items, deadline, args.seed * 1000 + index, samples, lock),
++                    )
++                    for index in range(args.clients)
++                ]
++                started = time.monotonic()
++                for thread in threads:
++                    thread.start()
++                for thread in threads:
++                    thread.join()
++                elapsed = time.monotonic() - started
++        finally:
++            server.terminate()
++            server.wait(30)
++        conn = app.get_connection(db_path, read_only=True)
++        try:
++            ledger_mismatches = len(app.verify_ledger(conn.cursor()))
++        finally:
++            conn.close()
++
++    results = {
++        "timestamp": datetime.utcnow().isoformat(),
++        "config": {
++            "items": args.items,
++            "movements": args.movements,
++            "usage": args.usage,
++            "clients": args.clients,
++            "duration": args.duration,
++            "mix": mix,
++            "server_env": server_env,
++        },
++        "total_requests": len(samples),
++        "throughput_rps": round(len(samples) / elapsed, 2),
++        "ledger_mismatches": ledger_mismatches,
++        "endpoints": summarize(samples, elapsed),
++    }
++    print(json.dumps(results, indent=2))
++    if args.output:
++        args.output.write_text(json.dumps(results, indent=2))
++    failures = []
++    if ledger_mismatches:
++        failures.append(f"{ledger_mismatches} items drifted from the movement ledger")
++    if args.compare:
++        failures += compare(results, json.loads(args.compare.read_text()), args.max_regression)
++    for failure in failures:
++        print(f"REGRESSION: {failure}")
++    if failures:
++        raise SystemExit(1)
++
++
++if __name__ == "__main__":
++    main()
+ 
+EOF
+)
@@ -0,0 +1,88 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/benchmarks/serialize_items.py
+index 0000000000000000000000000000000000000000..226362872ab31f55bbabd9ea5110c46c1726e202 100644
+--- a//dev/null
++++ b/benchmarks/serialize_items.py
+@@ -0,0 +1,79 @@
++import argparse
++import json
++import sys
++import tempfile
++import time
++from pathlib import Path
++
++sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
++
++import app
++
++
++def seed_items(conn, count):
++    conn.execute("BEGIN IMMEDIATE")
++    app.insert_items(
++        conn,
++        [
++            {
++                "barcode": f"BENCH{index:06d}",
++                "name": f"Color {index:06d}",
++                "brand": ("Wella", "Redken", "Goldwell", "Schwarzkopf")[index % 4],
++                "item_type": "color",
++                "attributes": json.dumps({"level": index % 10 + 1, "tone": "NABGV"[index % 5], "line": "Koleston"}),
++                "unit_size": "60ml",
++                "unit_cost": 7.25,
++                "stock_level": index % 40,
++                "min_stock": 5,
++                "max_stock": 30,
++            }
++            for index in range(count)
++        ],
++    )
++    conn.commit()
++
++
++def best_of(function, repeat):
++    timings = []
++    for _ in range(repeat):
++        start = time.perf_counter()
++        function()
++        timings.append(time.perf_counter() - start)
++    return min(timings)
++
++
++def main(argv=None):
++    parser = argparse.ArgumentParser(description="Compare plain and cached item list serialization")
++    parser.add_argument("--items", type=int, default=10_000)
++    parser.add_argument("--repeat", type=int, default=5)
++    args = parser.parse_args(argv)
++    with tempfile.TemporaryDirectory() as directory:
++        conn = app.get_connection(Path(directory) / "bench.db")
++        try:
++            app.migrate(conn)
++            seed_items(conn, args.items)
++            rows = conn.execute("SELECT * FROM inventory_items ORDER BY name, id").fetchall()
++        finally:
++            conn.close()
++    cache = app.SerializedItemCache()
++
++    def plain():
++        return json.dumps({"items": [app.serialize_item(row) for row in rows]}).encode("utf-8")
++
++    def cached():
++        return app.splice_json([("items", app.join_fragments(cache.fragments(rows)))])
++
++    cold = best_of(lambda: app.SerializedItemCache().fragments(rows), 1)
++    if cached() != plain():
++        raise SystemExit("cached output differs from the plain serializer")
++    plain_time = best_of(plain, args.repeat)
++    cached_time = best_of(cached, args.repeat)
++    print(f"items: {len(rows)}")
++    print(f"plain serialize_item + json.dumps: {plain_time * 1000:.1f} ms")
++    print(f"cache fill (cold):                 {cold * 1000:.1f} ms")
++    print(f"cached fragments (warm):           {cached_time * 1000:.1f} ms")
++    print(f"speedup: {plain_time / cached_time:.1f}x")
++
++
++if __name__ == "__main__":
++    main()
+ 
+EOF
+)
@@ -1,9 +1,9 @@
  (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
 diff --git a//dev/null b/static/app.js
-index 0000000000000000000000000000000000000000..8d8fd0138b37ba9da9345513fd0b208ef04c4473 100644
+index 0000000000000000000000000000000000000000..aa9d83a22b9ec5bca39ea66d40c44ca2f3378bb4 100644
 --- a//dev/null
 +++ b/static/app.js
-@@ -0,0 +1,395 @@
+@@ -0,0 +1,423 @@
 +const state = {
 +    items: [],
 +    shoppingList: [],
@@ -12,6 +12,7 @@ index 0000000000000000000000000000000000000000..8d8fd0138b37ba9da9345513fd0b208e
 +};
 +
 +const toast = document.querySelector('.toast');
++const apiBase = (window.location.pathname.match(/^\/locations\/[^/]+/) || [''])[0];
 +
 +function showToast(message, variant = 'info') {
 +    toast.textContent = message;
@@ -27,7 +28,7 @@ index 0000000000000000000000000000000000000000..8d8fd0138b37ba9da9345513fd0b208e
 +}
 +
 +async function request(path, options = {}) {
-+    const response = await fetch(path, {
++    const response = await fetch(apiBase + path, {
 +        headers: { 'Content-Type': 'application/json' },
 +        ...options,
 +    });
@@ -217,12 +218,13 @@ index 0000000000000000000000000000000000000000..8d8fd0138b37ba9da9345513fd0b208e
 +}
 +
 +async function loadDashboard() {
-+    const data = await request('/api/dashboard');
++    const data = await request('/api/v2/dashboard?sections=summary,items,recent_usage,movements');
++    const { summary } = data;
 +    state.items = data.items;
-+    document.getElementById('metric-value').textContent = formatCurrency(data.total_value);
-+    document.getElementById('metric-units').textContent = data.total_units;
-+    document.querySelector('#metric-low-stock .metric').textContent = data.low_stock.length;
-+    document.querySelector('#metric-overstock .metric').textContent = data.overstock.length;
++    document.getElementById('metric-value').textContent = formatCurrency(summary.total_value);
++    document.getElementById('metric-units').textContent = summary.total_units;
++    document.querySelector('#metric-low-stock .metric').textContent = summary.low_count;
++    document.querySelector('#metric-overstock .metric').textContent = summary.overstock_count;
 +    renderInventory(data.items);
 +    renderActivity(data.movements);
 +    renderUsage(data.recent_usage);
@@ -235,9 +237,9 @@ index 0000000000000000000000000000000000000000..8d8fd0138b37ba9da9345513fd0b208e
 +    drawDonutChart(
 +        document.getElementById('stock-health'),
 +        [
-+            { value: data.low_stock.length, colorStart: '#f97316', colorEnd: '#facc15' },
-+            { value: data.overstock.length, colorStart: '#22d3ee', colorEnd: '#3b82f6' },
-+            { value: data.items.length - data.low_stock.length - data.overstock.length, colorStart: '#34d399', colorEnd: '#10b981' },
++            { value: summary.low_count, colorStart: '#f97316', colorEnd: '#facc15' },
++            { value: summary.overstock_count, colorStart: '#22d3ee', colorEnd: '#3b82f6' },
++            { value: summary.item_count - summary.low_count - summary.overstock_count, colorStart: '#34d399', colorEnd: '#10b981' },
 +        ]
 +    );
 +}
@@ -391,11 +393,37 @@ index 0000000000000000000000000000000000000000..8d8fd0138b37ba9da9345513fd0b208e
 +    });
 +}
 +
++function subscribeToChanges() {
++    if (!('EventSource' in window)) {
++        setInterval(refreshAll, 60_000);
++        return;
++    }
++    let pending = null;
++    const scheduleRefresh = () => {
++        clearTimeout(pending);
++        pending = setTimeout(() => {
++            refreshAll().catch((error) => showToast(error.message, 'error'));
++        }, 250);
++    };
++    const source = new EventSource(`${apiBase}/api/events`);
++    [
++        'item.created',
++        'item.updated',
++        'item.stock',
++        'items.imported',
++        'items.adjusted',
++        'shopping_list.added',
++        'shopping_list.removed',
++        'usage.recorded',
++        'reset',
++    ].forEach((type) => source.addEventListener(type, scheduleRefresh));
++}
++
 +async function init() {
 +    setupForms();
 +    setupNavigation();
 +    await refreshAll();
-+    setInterval(refreshAll, 60_000);
++    subscribeToChanges();
 +}
 +
 +document.addEventListener('DOMContentLoaded', init);
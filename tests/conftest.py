@@ -0,0 +1,67 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/conftest.py
+index 0000000000000000000000000000000000000000..96ec1ef2dcdb3e960ca538e9c531d6026a96f754 100644
+--- a//dev/null
++++ b/tests/conftest.py
+@@ -0,0 +1,58 @@
++import http.client
++import os
++import socket
++import subprocess
++import sys
++import time
++from pathlib import Path
++
++import pytest
++
++ROOT = Path(__file__).resolve().parents[1]
++sys.path.insert(0, str(ROOT))
++
++
++def free_port():
++    with socket.socket() as sock:
++        sock.bind(("127.0.0.1", 0))
++        return sock.getsockname()[1]
++
++
++@pytest.fixture
++def start_server(tmp_path):
++    processes = []
++
++    def start(**env):
++        port = free_port()
++        server_env = dict(os.environ, PORT=str(port), PROCESSES="1", INVENTORY_DB=str(tmp_path / "inventory.db"))
++        server_env.update({key: str(value) for key, value in env.items()})
++        server_env.pop("LOCATIONS", None)
++        process = subprocess.Popen(
++            [sys.executable, str(ROOT / "app.py")],
++            env=server_env,
++            stdout=subprocess.DEVNULL,
++            stderr=open(tmp_path / f"server-{port}.log", "wb"),
++        )
++        processes.append(process)
++        deadline = time.monotonic() + 10
++        while time.monotonic() < deadline:
++            try:
++                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
++                conn.request("GET", "/api/metrics")
++                conn.getresponse().read()
++                conn.close()
++                return port
++            except (OSError, http.client.HTTPException):
++                if process.poll() is not None:
++                    raise RuntimeError((tmp_path / f"server-{port}.log").read_text())
++                time.sleep(0.05)
++        raise RuntimeError("server did not start")
++
++    yield start
++    for process in processes:
++        process.terminate()
++        try:
++            process.wait(15)
++        except subprocess.TimeoutExpired:
++            process.kill()
++            process.wait()
+ 
+EOF
+)
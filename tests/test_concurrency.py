@@ -0,0 +1,170 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_concurrency.py
+index 0000000000000000000000000000000000000000..091db252b40d9e050f028b5b20f756a04b14ed34 100644
+--- a//dev/null
++++ b/tests/test_concurrency.py
+@@ -0,0 +1,161 @@
++import http.client
++import json
++import random
++import socket
++import sqlite3
++import threading
++import time
++
++SEED_STOCK = 100_000
++CLIENTS = 12
++REQUESTS_PER_CLIENT = 40
++USAGE_STOCK = 60
++
++
++def request(port, method, path, payload=None):
++    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
++    try:
++        body = json.dumps(payload).encode("utf-8") if payload is not None else None
++        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
++        response = conn.getresponse()
++        return response.status, response.read(), response.getheader("Retry-After")
++    finally:
++        conn.close()
++
++
++def new_item(barcode, stock):
++    return {
++        "barcode": barcode,
++        "name": "Stress Color",
++        "brand": "Wella",
++        "item_type": "color",
++        "attributes": {"tone": "7N"},
++        "unit_size": "60ml",
++        "total_cost": 10,
++        "stock_level": stock,
++        "min_stock": 1,
++        "max_stock": SEED_STOCK * 2,
++    }
++
++
++def test_concurrent_adjustments_keep_stock_consistent(start_server, tmp_path):
++    port = start_server()
++    assert request(port, "POST", "/api/items", new_item("STRESS1", SEED_STOCK))[0] == 201
++    applied = []
++    failures = []
++    lock = threading.Lock()
++
++    def client(seed):
++        rng = random.Random(seed)
++        for _ in range(REQUESTS_PER_CLIENT):
++            try:
++                if rng.random() < 0.3:
++                    status = request(port, "GET", "/api/items?limit=10")[0]
++                    delta = None
++                else:
++                    delta = rng.randint(-5, 3) or -1
++                    status = request(
++                        port, "POST", "/api/items/adjust", {"barcode": "STRESS1", "delta": delta, "reason": "stress"}
++                    )[0]
++            except (OSError, http.client.HTTPException) as exc:
++                with lock:
++                    failures.append(repr(exc))
++                continue
++            with lock:
++                if status != 200:
++                    failures.append(status)
++                elif delta is not None:
++                    applied.append(delta)
++
++    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(CLIENTS)]
++    for thread in threads:
++        thread.start()
++    for thread in threads:
++        thread.join()
++
++    assert failures == []
++    conn = sqlite3.connect(tmp_path / "inventory.db")
++    try:
++        stock = conn.execute("SELECT stock_level FROM inventory_items WHERE barcode = 'STRESS1'").fetchone()[0]
++        ledger = conn.execute(
++            "SELECT SUM(change_amount) FROM inventory_movements im JOIN inventory_items ii ON ii.id = im.item_id"
++            " WHERE ii.barcode = 'STRESS1'"
++        ).fetchone()[0]
++    finally:
++        conn.close()
++    assert stock == SEED_STOCK + sum(applied)
++    assert ledger == stock
++
++
++def test_concurrent_usage_never_overdraws_stock(start_server, tmp_path):
++    port = start_server()
++    assert request(port, "POST", "/api/items", new_item("USAGE1", USAGE_STOCK))[0] == 201
++    applied = []
++    rejected = []
++    failures = []
++    lock = threading.Lock()
++
++    def client(seed):
++        rng = random.Random(seed)
++        for _ in range(REQUESTS_PER_CLIENT // 4):
++            amount = rng.randint(1, 3)
++            usage = {
++                "client_name": f"Client {seed}",
++                "usage_date": "2026-01-01",
++                "before_state": "before",
++                "after_state": "after",
++                "items": [{"barcode": "USAGE1", "amount": amount}],
++            }
++            try:
++                status = request(port, "POST", "/api/usage", usage)[0]
++            except (OSError, http.client.HTTPException) as exc:
++                with lock:
++                    failures.append(repr(exc))
++                continue
++            with lock:
++                if status == 200:
++                    applied.append(amount)
++                elif status == 409:
++                    rejected.append(amount)
++                else:
++                    failures.append(status)
++
++    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(CLIENTS)]
++    for thread in threads:
++        thread.start()
++    for thread in threads:
++        thread.join()
++
++    assert failures == []
++    assert len(applied) + len(rejected) == CLIENTS * (REQUESTS_PER_CLIENT // 4)
++    assert rejected
++    conn = sqlite3.connect(tmp_path / "inventory.db")
++    try:
++        stock = conn.execute("SELECT stock_level FROM inventory_items WHERE barcode = 'USAGE1'").fetchone()[0]
++        ledger = conn.execute(
++            "SELECT SUM(change_amount) FROM inventory_movements im JOIN inventory_items ii ON ii.id = im.item_id"
++            " WHERE ii.barcode = 'USAGE1'"
++        ).fetchone()[0]
++        records = conn.execute("SELECT COUNT(*) FROM usage_records").fetchone()[0]
++    finally:
++        conn.close()
++    assert stock >= 0
++    assert stock == USAGE_STOCK - sum(applied)
++    assert ledger == stock
++    assert records == len(applied)
++
++
++def test_saturated_server_sheds_with_retry_after(start_server):
++    port = start_server(SERVER_WORKERS=1, SERVER_QUEUE_SIZE=1, KEEPALIVE_TIMEOUT=3)
++    idle = []
++    try:
++        for _ in range(2):
++            idle.append(socket.create_connection(("127.0.0.1", port)))
++            time.sleep(0.3)
++        status, body, retry_after = request(port, "GET", "/api/items")
++        assert status == 503
++        assert retry_after is not None
++        assert "error" in json.loads(body)
++    finally:
++        for sock in idle:
++            sock.close()
+ 
+EOF
+)
@@ -0,0 +1,38 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_cursors.py
+index 0000000000000000000000000000000000000000..3658d8864dfb8222fc5056f4921b1a321b0c56c6 100644
+--- a//dev/null
++++ b/tests/test_cursors.py
+@@ -0,0 +1,29 @@
++import base64
++import json
++
++import pytest
++
++import app
++
++
++def encode(values):
++    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
++
++
++def test_cursor_round_trip():
++    assert app.decode_cursor(app.encode_cursor(["Alpha", 7]), 2) == ["Alpha", 7]
++    assert app.decode_cursor(encode([None, 3]), 2) == [None, 3]
++
++
++@pytest.mark.parametrize(
++    "values",
++    [[{"a": 1}, 2], [["x"], 2], ["x", "y"], ["x", True], ["x", 1.5], ["x"], "x"],
++)
++def test_malformed_cursor_is_rejected(values):
++    with pytest.raises(ValueError, match="Invalid cursor"):
++        app.decode_cursor(encode(values), 2)
++
++
++def test_garbage_cursor_is_rejected():
++    with pytest.raises(ValueError, match="Invalid cursor"):
++        app.decode_cursor("not base64!", 2)
+ 
+EOF
+)
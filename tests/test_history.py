@@ -0,0 +1,81 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_history.py
+index 0000000000000000000000000000000000000000..4449de6aab1cf6f20a7b687e0fb5fc9baf844733 100644
+--- a//dev/null
++++ b/tests/test_history.py
+@@ -0,0 +1,72 @@
++import http.client
++import json
++import os
++import sqlite3
++import subprocess
++import sys
++from datetime import datetime, timedelta
++
++from conftest import ROOT
++
++
++def get(port, path, headers=None):
++    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++    try:
++        conn.request("GET", path, headers=headers or {})
++        response = conn.getresponse()
++        return response.status, json.loads(response.read() or b"null"), response.getheader("ETag")
++    finally:
++        conn.close()
++
++
++def post(port, path, payload):
++    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++    try:
++        conn.request("POST", path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
++        response = conn.getresponse()
++        response.read()
++        return response.status
++    finally:
++        conn.close()
++
++
++def test_default_window_starts_at_pruned_history(start_server, tmp_path):
++    port = start_server()
++    item = {
++        "barcode": "HIST1",
++        "name": "History Color",
++        "brand": "Wella",
++        "item_type": "color",
++        "attributes": {"tone": "7N"},
++        "unit_size": "60ml",
++        "total_cost": 10,
++        "stock_level": 10,
++        "min_stock": 1,
++        "max_stock": 50,
++    }
++    assert post(port, "/api/items", item) == 201
++    for delta in (-2, 3, -1):
++        assert post(port, "/api/items/adjust", {"barcode": "HIST1", "delta": delta, "reason": "test"}) == 200
++    old = (datetime.utcnow() - timedelta(days=400)).isoformat()
++    conn = sqlite3.connect(tmp_path / "inventory.db")
++    with conn:
++        conn.execute("UPDATE inventory_movements SET created_at = ? WHERE id = (SELECT MIN(id) FROM inventory_movements)", (old,))
++    conn.close()
++    subprocess.run(
++        [sys.executable, str(ROOT / "app.py"), "compact", "--prune"],
++        env=dict(os.environ, INVENTORY_DB=str(tmp_path / "inventory.db")),
++        check=True,
++        capture_output=True,
++    )
++
++    status, body, etag = get(port, "/api/items/HIST1/history")
++    assert status == 200
++    assert body["from"] > (datetime.utcnow() - timedelta(days=366)).isoformat()
++    assert body["points"][-1]["stock_level"] == 10
++    assert etag.endswith(datetime.utcnow().strftime('-%Y%m%dT00"'))
++    assert get(port, "/api/items/history")[0] == 200
++    assert get(port, "/api/items/HIST1/history", {"If-None-Match": etag})[0] == 304
++
++    status, body, _ = get(port, f"/api/items/HIST1/history?from={old}")
++    assert status == 410
++    assert "pruned" in body["error"]
+ 
+EOF
+)
@@ -0,0 +1,66 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_keepalive.py
+index 0000000000000000000000000000000000000000..0de0bf500e7bf48cb67798e1e2a190abbad37dd7 100644
+--- a//dev/null
++++ b/tests/test_keepalive.py
+@@ -0,0 +1,57 @@
++import http.client
++import json
++import socket
++import time
++
++
++def read_head(sock):
++    data = b""
++    while b"\r\n\r\n" not in data:
++        chunk = sock.recv(4096)
++        if not chunk:
++            break
++        data += chunk
++    return data.partition(b"\r\n\r\n")[0]
++
++
++def test_continue_response_carries_no_connection_headers(start_server):
++    port = start_server()
++    body = json.dumps({"barcode": "MISSING", "change_amount": 1}).encode("utf-8") + b" " * 200_000
++    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
++        sock.sendall(
++            b"POST /api/items/adjust HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
++            b"Expect: 100-continue\r\nContent-Length: %d\r\n\r\n" % len(body)
++        )
++        assert read_head(sock) == b"HTTP/1.1 100 Continue"
++        sock.sendall(body)
++        head = read_head(sock)
++    assert head.startswith(b"HTTP/1.1 ")
++    assert b"Keep-Alive: " in head
++    assert b"Connection: close" not in head
++
++
++def test_idle_keepalive_connections_do_not_hold_workers(start_server):
++    port = start_server(SERVER_WORKERS=2, KEEPALIVE_TIMEOUT=30)
++    idle = []
++    for _ in range(6):
++        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++        conn.request("GET", "/api/dashboard")
++        response = conn.getresponse()
++        response.read()
++        assert response.getheader("Connection") != "close"
++        idle.append(conn)
++    try:
++        started = time.monotonic()
++        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++        conn.request("GET", "/api/dashboard")
++        assert conn.getresponse().status == 200
++        conn.close()
++        assert time.monotonic() - started < 1
++        for conn in idle:
++            conn.request("GET", "/api/dashboard")
++            response = conn.getresponse()
++            response.read()
++            assert response.status == 200
++    finally:
++        for conn in idle:
++            conn.close()
+ 
+EOF
+)
@@ -0,0 +1,22 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_locations.py
+index 0000000000000000000000000000000000000000..67b9b2d6993948c9c9f7789e01c812954eb8e4a3 100644
+--- a//dev/null
++++ b/tests/test_locations.py
+@@ -0,0 +1,13 @@
++import os
++import subprocess
++import sys
++
++from conftest import ROOT
++
++
++def test_unknown_default_location_is_rejected_at_startup(tmp_path):
++    env = dict(os.environ, LOCATIONS="north,south", LOCATIONS_DIR=str(tmp_path), DEFAULT_LOCATION="east", PORT="0")
++    result = subprocess.run([sys.executable, str(ROOT / "app.py")], env=env, capture_output=True, text=True, timeout=30)
++    assert result.returncode == 2
++    assert "DEFAULT_LOCATION 'east' is not a configured location (north, south)" in result.stderr
++    assert not list(tmp_path.iterdir())
+ 
+EOF
+)
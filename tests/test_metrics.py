@@ -0,0 +1,61 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_metrics.py
+index 0000000000000000000000000000000000000000..d90593011aa45659fbb25dbe5c52422920e54f1a 100644
+--- a//dev/null
++++ b/tests/test_metrics.py
+@@ -0,0 +1,52 @@
++import http.client
++import time
++
++import app
++
++
++def scrape(port):
++    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++    conn.request("GET", "/api/metrics")
++    body = conn.getresponse().read().decode("utf-8")
++    conn.close()
++    samples = {}
++    for line in body.splitlines():
++        if not line.startswith("#"):
++            series, _, value = line.rpartition(" ")
++            samples[series] = float(value)
++    return samples
++
++
++def route_requests(samples, route):
++    return sum(value for series, value in samples.items() if series.startswith("inventory_http_requests_total") and f'route="{route}"' in series)
++
++
++def test_merge_metrics_sums_series_across_workers():
++    first = '# TYPE a counter\na{x="1"} 2\nb_sum 0.250000\n'
++    second = '# TYPE a counter\na{x="1"} 3\na{x="2"} 1\nb_sum 0.500000\n'
++    merged = app.merge_metrics([first, second]).splitlines()
++    assert merged[:4] == ["# TYPE a counter", 'a{x="1"} 5', "b_sum 0.750000", 'a{x="2"} 1']
++    assert merged[-1] == "inventory_metrics_workers 2"
++
++
++def test_metrics_cover_every_worker_process(start_server):
++    port = start_server(PROCESSES=2)
++    deadline = time.monotonic() + 10
++    while scrape(port).get("inventory_metrics_workers") != 2:
++        assert time.monotonic() < deadline, "second worker never reported"
++        time.sleep(0.1)
++    for _ in range(12):
++        # A fresh connection per request lets the kernel spread them over both workers.
++        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++        conn.request("GET", "/api/dashboard")
++        conn.getresponse().read()
++        conn.close()
++    # A request is counted just after its response is sent, so give the last one a moment.
++    deadline = time.monotonic() + 5
++    while route_requests(scrape(port), "/api/dashboard") < 12:
++        assert time.monotonic() < deadline, "requests missing from the merged metrics"
++        time.sleep(0.05)
++    for _ in range(4):
++        samples = scrape(port)
++        assert samples["inventory_metrics_workers"] == 2
++        assert route_requests(samples, "/api/dashboard") == 12
+ 
+EOF
+)
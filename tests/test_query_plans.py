@@ -0,0 +1,35 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_query_plans.py
+index 0000000000000000000000000000000000000000..4825ae3d0679ebbb47c503246c43d3c56dfcff3b 100644
+--- a//dev/null
++++ b/tests/test_query_plans.py
+@@ -0,0 +1,26 @@
++import app
++
++
++def migrated_connection(path):
++    conn = app.get_connection(path)
++    app.migrate(conn)
++    return conn
++
++
++def test_hot_queries_use_their_indexes(tmp_path):
++    conn = migrated_connection(tmp_path / "inventory.db")
++    try:
++        assert app.check_query_plans(conn) == []
++    finally:
++        conn.close()
++
++
++def test_dropped_index_is_reported(tmp_path):
++    conn = migrated_connection(tmp_path / "inventory.db")
++    try:
++        conn.execute("DROP INDEX idx_movements_created")
++        problems = app.check_query_plans(conn)
++    finally:
++        conn.close()
++    assert any(problem.startswith("recent_movements ") for problem in problems)
++    assert any("scans a full table" in problem for problem in problems)
+ 
+EOF
+)
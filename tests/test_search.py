@@ -0,0 +1,48 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_search.py
+index 0000000000000000000000000000000000000000..59c37a72c0b1e3ab49f62f5c3cddce6b7d792253 100644
+--- a//dev/null
++++ b/tests/test_search.py
+@@ -0,0 +1,39 @@
++import http.client
++import json
++import sqlite3
++from urllib.parse import quote
++
++
++def get(port, path):
++    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++    try:
++        conn.request("GET", path)
++        response = conn.getresponse()
++        return response.status, json.loads(response.read())
++    finally:
++        conn.close()
++
++
++def test_usage_search_ranks_and_pages_over_every_match(start_server, tmp_path):
++    port = start_server()
++    conn = sqlite3.connect(tmp_path / "inventory.db")
++    with conn:
++        # The best match is the oldest record, behind 1200 weaker newer ones.
++        rows = [("Marigold", "Marigold Marigold", "natural")]
++        rows += [(f"Client {n}", "virgin hair", f"toned towards marigold copper {n}") for n in range(1200)]
++        conn.executemany(
++            "INSERT INTO usage_records (client_name, usage_date, before_state, after_state, total_cost, created_at)"
++            " VALUES (?, '2024-01-01', ?, ?, 0, '2024-01-01T00:00:00')",
++            rows,
++        )
++    conn.close()
++    status, payload = get(port, "/api/search?q=marigold&type=usage&limit=500")
++    assert status == 200
++    assert payload["usage"]["results"][0]["client_name"] == "Marigold"
++    seen = [row["id"] for row in payload["usage"]["results"]]
++    while payload["usage"]["next_cursor"]:
++        cursor = quote(payload["usage"]["next_cursor"])
++        status, payload = get(port, f"/api/search?q=marigold&type=usage&limit=500&cursor={cursor}")
++        assert status == 200
++        seen += [row["id"] for row in payload["usage"]["results"]]
++    assert len(seen) == len(set(seen)) == 1201
+ 
+EOF
+)
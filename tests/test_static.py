@@ -0,0 +1,34 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_static.py
+index 0000000000000000000000000000000000000000..c75b1181b0a31a0f5d9ed7fb3d0d236e8c09c82e 100644
+--- a//dev/null
++++ b/tests/test_static.py
+@@ -0,0 +1,25 @@
++import http.client
++
++
++def fetch(port, headers):
++    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++    try:
++        conn.request("GET", "/app.js", headers=headers)
++        response = conn.getresponse()
++        response.read()
++        return response.status, response.getheader("ETag")
++    finally:
++        conn.close()
++
++
++def test_not_modified_returns_the_etag_of_the_served_variant(start_server):
++    port = start_server()
++    status, gzip_etag = fetch(port, {"Accept-Encoding": "gzip"})
++    assert status == 200
++    status, identity_etag = fetch(port, {})
++    assert status == 200
++    assert gzip_etag != identity_etag
++
++    assert fetch(port, {"Accept-Encoding": "gzip", "If-None-Match": gzip_etag}) == (304, gzip_etag)
++    assert fetch(port, {"If-None-Match": identity_etag}) == (304, identity_etag)
++    assert fetch(port, {"If-None-Match": gzip_etag}) == (200, identity_etag)
+ 
+EOF
+)
@@ -0,0 +1,107 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_validation.py
+index 0000000000000000000000000000000000000000..d2b6159254cefbdb7b8e3800871905565880796c 100644
+--- a//dev/null
++++ b/tests/test_validation.py
+@@ -0,0 +1,98 @@
++import http.client
++import json
++
++import pytest
++
++import app
++
++NEW_ITEM = {
++    "barcode": "111",
++    "name": "Color",
++    "brand": "Wella",
++    "item_type": "color",
++    "attributes": {"tone": "7N"},
++    "unit_size": "60ml",
++    "total_cost": 10,
++    "stock_level": 5,
++    "min_stock": 1,
++    "max_stock": 20,
++}
++
++
++@pytest.mark.parametrize("barcode", [["111"], {"code": "111"}, None, "", True, 1.5])
++def test_new_item_barcode_must_be_a_string(barcode):
++    with pytest.raises(ValueError, match="Barcode must be a non-empty string"):
++        app.validate_new_item(dict(NEW_ITEM, barcode=barcode))
++
++
++@pytest.mark.parametrize("barcode", [["111"], {"code": "111"}, None, "", True, 1.5])
++def test_adjustment_barcode_must_be_a_string(barcode):
++    with pytest.raises(ValueError, match="Barcode must be a non-empty string"):
++        app.validate_adjustment({"barcode": barcode, "delta": 1, "reason": "restock"})
++
++
++def test_numeric_barcode_is_normalized():
++    assert app.validate_new_item(dict(NEW_ITEM, barcode=111))["barcode"] == "111"
++    assert app.validate_adjustment({"barcode": 111, "delta": 1, "reason": "restock"})["barcode"] == "111"
++
++
++def test_valid_rows_pass():
++    assert app.validate_new_item(NEW_ITEM)["barcode"] == "111"
++    assert app.validate_adjustment({"barcode": "111", "delta": "2", "reason": "restock"})["delta"] == 2
++
++
++@pytest.mark.parametrize("field", ["name", "brand", "item_type", "unit_size"])
++@pytest.mark.parametrize("value", [None, "", 7, ["x"]])
++def test_new_item_text_fields_must_be_strings(field, value):
++    with pytest.raises(ValueError, match="must be a non-empty string"):
++        app.validate_new_item(dict(NEW_ITEM, **{field: value}))
++
++
++@pytest.mark.parametrize("reason", [None, "", {"why": "restock"}])
++def test_adjustment_reason_must_be_a_string(reason):
++    with pytest.raises(ValueError, match="Reason must be a non-empty string"):
++        app.validate_adjustment({"barcode": "111", "delta": 1, "reason": reason})
++
++
++def post(port, path, payload, method="POST"):
++    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
++    try:
++        conn.request(method, path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
++        response = conn.getresponse()
++        return response.status, json.loads(response.read())
++    finally:
++        conn.close()
++
++
++def test_bulk_endpoints_report_invalid_rows(start_server):
++    port = start_server()
++    status, body = post(port, "/api/items/bulk", [NEW_ITEM, dict(NEW_ITEM, barcode="222", name=None)])
++    assert status == 400
++    assert [result["status"] for result in body["results"]] == ["created", "error"]
++    assert body["results"][1]["error"] == "Name must be a non-empty string"
++
++    assert post(port, "/api/items/bulk", [NEW_ITEM])[0] == 201
++    status, body = post(
++        port,
++        "/api/items/adjust/bulk",
++        [{"barcode": "111", "delta": 1, "reason": "restock"}, {"barcode": "111", "delta": 1, "reason": None}],
++    )
++    assert status == 400
++    assert body["results"][1] == {"row": 2, "status": "error", "error": "Reason must be a non-empty string"}
++
++
++def test_write_endpoints_agree_on_barcodes(start_server):
++    port = start_server()
++    assert post(port, "/api/items", NEW_ITEM)[0] == 201
++    assert post(port, "/api/items", {"barcode": 111, "name": "Renamed"}, method="PUT")[0] == 200
++    assert post(port, "/api/items/adjust", {"barcode": 111, "delta": 1, "reason": "restock"})[0] == 200
++    usage = {"client_name": "Ann", "usage_date": "2026-01-01", "before_state": "a", "after_state": "b"}
++    assert post(port, "/api/usage", dict(usage, items=[{"barcode": 111, "amount": 1}]))[0] == 200
++    for barcode in (["111"], {"code": "111"}, None):
++        assert post(port, "/api/items", {"barcode": barcode, "name": "x"}, method="PUT")[0] == 400
++        assert post(port, "/api/items/adjust", {"barcode": barcode, "delta": 1, "reason": "restock"})[0] == 400
++        assert post(port, "/api/usage", dict(usage, items=[{"barcode": barcode, "amount": 1}]))[0] == 400
++    assert post(port, "/api/items", {"barcode": "111", "name": None}, method="PUT") == (
++        400,
++        {"error": "Name must be a non-empty string"},
++    )
+ 
+EOF
+)
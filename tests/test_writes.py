@@ -0,0 +1,52 @@
+ (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
+diff --git a//dev/null b/tests/test_writes.py
+index 0000000000000000000000000000000000000000..ed44068610410ef8ece2e7a09539a707babc3e64 100644
+--- a//dev/null
++++ b/tests/test_writes.py
+@@ -0,0 +1,43 @@
++import sqlite3
++from http import HTTPStatus
++
++import pytest
++
++import app
++
++
++@pytest.fixture
++def coordinator(tmp_path):
++    location = app.Location("writes", tmp_path / "inventory.db")
++    app.initialize_database([location])
++    yield location.writes
++    location.close()
++
++
++def test_integrity_error_is_rejected_without_failing_the_batch(coordinator):
++    def broken(conn):
++        conn.execute("INSERT INTO usage_records (client_name) VALUES (NULL)")
++
++    with pytest.raises(app.WriteRejected) as caught:
++        coordinator.submit(broken)
++    assert caught.value.status == HTTPStatus.CONFLICT
++    assert "NOT NULL" in str(caught.value)
++    assert coordinator.submit(lambda conn: conn.execute("SELECT 1").fetchone()[0]) == 1
++    assert coordinator.failed_batches == 0
++
++
++def test_value_error_is_rejected_as_bad_request(coordinator):
++    def invalid(conn):
++        raise ValueError("Amount must be positive")
++
++    with pytest.raises(app.WriteRejected) as caught:
++        coordinator.submit(invalid)
++    assert caught.value.status == HTTPStatus.BAD_REQUEST
++
++
++def test_other_errors_are_not_masked(coordinator):
++    def failing(conn):
++        raise sqlite3.OperationalError("no such table: missing")
++
++    with pytest.raises(sqlite3.OperationalError):
++        coordinator.submit(failing)
+ 
+EOF
+)